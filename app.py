@@ -1,15 +1,21 @@
 import streamlit as st
 import os, requests
 from time import sleep
-from rag.document_rag import process_documents, load_vector_store, query_documents
+from rag.document_rag import process_documents, load_vector_store, load_lexical_index, query_documents
+from rag.context_packer import pack_context
 from rag.website_rag import process_website
-from gemini_llm import generate_answer
+from gemini_llm import stream_answer
 from rag.video_rag import process_youtube
-from utils.db_utils import init_db, create_session_record, verify_user, add_user, update_conversation_in_db, get_all_sessions_helper
+from rag.ingest_utils import InMemoryUpload
+from rag.shared_sources import session_has_sources, list_session_sources, remove_session_source
+from rag.store_lifecycle import start_store_lifecycle
+from utils.job_queue import submit_job, get_job
+from utils.db_utils import init_db, create_session_record, verify_user, add_user, append_messages, get_session_summaries_helper, get_all_messages_helper
 from streamlit_cookies_controller import CookieController
 
 os.environ["USER_AGENT"] = "my-rag-app/1.0"
 controller = CookieController()
+SIDEBAR_SESSIONS_PAGE_SIZE = 20
 
 def show_auth_form():
     tab1, tab2 = st.tabs(["Login", "Signup"])
@@ -76,9 +82,55 @@ def show_auth_form():
             else:
                 st.warning("Please fill all fields.")
     
+def submit_ingestion_job():
+    user_id = st.session_state.user_id
+    session_id = st.session_state.session_id
+    job_id = None
+    if st.session_state.source == "Documents" and st.session_state.get("uploaded_files"):
+        uploads = [InMemoryUpload(file.name, file.getvalue()) for file in st.session_state.uploaded_files]
+        job_id = submit_job("documents", user_id, session_id, process_documents, uploads, user_id, session_id)
+    elif st.session_state.source == "Website" and st.session_state.get("source_url"):
+        job_id = submit_job("website", user_id, session_id, process_website, st.session_state.source_url, user_id, session_id)
+    elif st.session_state.source == "Youtube" and st.session_state.get("source_url"):
+        job_id = submit_job("youtube", user_id, session_id, process_youtube, st.session_state.source_url, user_id, session_id)
+
+    if job_id:
+        st.session_state.ingestion_job_id = job_id
+        st.session_state.ingestion_job_session = session_id
+    else:
+        st.sidebar.warning("Please provide a source first.")
+
+def show_ingestion_status():
+    job_id = st.session_state.get("ingestion_job_id")
+    if not job_id or st.session_state.get("ingestion_job_session") != st.session_state.session_id:
+        return
+
+    job = get_job(job_id)
+    if job is None:
+        return
+
+    if job["status"] == "completed":
+        message = f"Source processed: {job['chunks_total'] or 0} chunks in {job['elapsed_seconds']} s"
+        if job["pages_fetched"] is not None:
+            message += f" ({job['pages_fetched']} pages fetched, {job['pages_unchanged']} unchanged)"
+        if job["sources_linked"]:
+            message += f", {job['sources_linked']} already-indexed source(s) reused"
+        st.sidebar.success(message)
+    elif job["status"] == "failed":
+        st.sidebar.error(f"Source processing failed: {job['error']}")
+    else:
+        message = f"Processing source ({job['stage']})"
+        if job["pages_fetched"] is not None:
+            message += f": {job['pages_fetched']} pages fetched"
+        if job["chunks_new"] is not None:
+            message += f": {job['chunks_embedded'] or 0}/{job['chunks_new']} new chunks embedded"
+        st.sidebar.info(message + ". You can keep chatting meanwhile.")
+        st.sidebar.button("Refresh status")
+
 def main():
     st.title("Multi Purpose RAG App")
     init_db()
+    start_store_lifecycle()
     if 'user_id' not in st.session_state:
         user_id = controller.get('user_id')
         session_id = controller.get('session_id')
@@ -114,27 +166,38 @@ def main():
             sleep(1)
             st.rerun()
 
-        vector_store_path = f"vector_store/{st.session_state.user_id}_{st.session_state.session_id}"
-        vector_store_exists = os.path.exists(vector_store_path)
+        vector_store_exists = session_has_sources(st.session_state.user_id, st.session_state.session_id)
 
         with st.sidebar.expander("Choose Source"):
             if vector_store_exists:
-                st.info("A source is already selected for this session.")
-            else:
-                st.session_state.source = st.radio(label="Select Source", options=["None", "Documents", "Website", "Youtube"], horizontal=True, label_visibility="collapsed")
-
-                if st.session_state.source == "Documents":
-                    uploaded_files = st.file_uploader("Upload Documents", accept_multiple_files=True, type=["pdf", "txt", "md"])
-                    if uploaded_files:
-                        st.session_state.uploaded_files = uploaded_files
-                elif st.session_state.source == "Website":
-                    url = st.text_input("Enter Website URL:")
-                    if url:
-                        st.session_state.source_url = url
-                elif st.session_state.source == "Youtube":
-                    url = st.text_input("Enter YouTube Video URL:")
-                    if url:
-                        st.session_state.source_url = url
+                st.caption("Sources in this session:")
+                for source in list_session_sources(st.session_state.user_id, st.session_state.session_id):
+                    col1, col2 = st.columns([4, 1])
+                    col1.write(f"{source['source']} ({source['chunks']} chunks)")
+                    if col2.button("✖", key=f"remove_{source['source']}"):
+                        remove_session_source(st.session_state.user_id, st.session_state.session_id, source["source"])
+                        st.rerun()
+                st.caption("Add another source:")
+
+            st.session_state.source = st.radio(label="Select Source", options=["None", "Documents", "Website", "Youtube"], horizontal=True, label_visibility="collapsed")
+
+            if st.session_state.source == "Documents":
+                uploaded_files = st.file_uploader("Upload Documents", accept_multiple_files=True, type=["pdf", "txt", "md"])
+                if uploaded_files:
+                    st.session_state.uploaded_files = uploaded_files
+            elif st.session_state.source == "Website":
+                url = st.text_input("Enter Website URL:")
+                if url:
+                    st.session_state.source_url = url
+            elif st.session_state.source == "Youtube":
+                url = st.text_input("Enter YouTube Video URL:")
+                if url:
+                    st.session_state.source_url = url
+
+            if st.session_state.source != "None" and st.button("Process Source"):
+                submit_ingestion_job()
+
+        show_ingestion_status()
 
         if st.sidebar.button("➕ Add New Session"):
             new_session_id = create_session_record(st.session_state.user_id)
@@ -148,7 +211,10 @@ def main():
         st.sidebar.markdown("### All Sessions")
 
         try:
-            session_list = get_all_sessions_helper(st.session_state.user_id)
+            if "sessions_limit" not in st.session_state:
+                st.session_state.sessions_limit = SIDEBAR_SESSIONS_PAGE_SIZE
+            page = get_session_summaries_helper(st.session_state.user_id, limit=st.session_state.sessions_limit)
+            session_list = page["sessions"]
 
             if session_list:
                 for sess in session_list:
@@ -156,8 +222,11 @@ def main():
                     if st.sidebar.button(label=label, key=sess["session_id"]):
                         controller.set('session_id', sess["session_id"])  
                         st.session_state.session_id = sess["session_id"]  
-                        st.session_state.messages = sess["conversation"] 
+                        st.session_state.messages = get_all_messages_helper(st.session_state.user_id, sess["session_id"])
                         st.rerun()
+                if page["next_cursor"] and st.sidebar.button("Show more sessions"):
+                    st.session_state.sessions_limit += SIDEBAR_SESSIONS_PAGE_SIZE
+                    st.rerun()
             else:
                 st.sidebar.info("No sessions found.")
         except Exception as e:
@@ -188,50 +257,45 @@ def main():
                 if vector_store_exists:
                     vector_store = load_vector_store(st.session_state.user_id, store_name=st.session_state.session_id)
                     if vector_store:
-                        context_docs = query_documents(vector_store, prompt, k=5)
-                else:
-                    if st.session_state.source == "Documents" and st.session_state.get("uploaded_files"):
-                        vector_store = process_documents(st.session_state.uploaded_files, st.session_state.user_id, store_name=st.session_state.session_id)
-                        if vector_store:
-                            context_docs = query_documents(vector_store, prompt, k=5)
-                    elif st.session_state.source == "Website" and st.session_state.get("source_url"):
-                        vector_store = process_website(st.session_state.source_url, st.session_state.user_id, store_name=st.session_state.session_id)
-                        if vector_store:
-                            context_docs = query_documents(vector_store, prompt, k=5)
-                    elif st.session_state.source == "Youtube":
-                        vector_store = process_youtube(st.session_state.source_url, st.session_state.user_id, store_name=st.session_state.session_id)
-                        if vector_store:
-                            context_docs = query_documents(vector_store, prompt, k=5)
-                                
-                with st.spinner("Generating response..."):
-                    try:
-                        # Taking last 4 messages for conversation context
-                        recent_history = st.session_state.messages[-6:-2]
-
-                        # Format conversation history
-                        conversation_history = "\n".join([
-                            f"{msg['role'].capitalize()}: {msg['content']}" for msg in recent_history
-                        ])
-
-                        # Combine conversation + user prompt
-                        if conversation_history:
-                            full_prompt = f"{prompt}\n\n### Conversation History:\n{conversation_history}"
-                        else:
-                            full_prompt = prompt
-                        
-                        if not context_docs:
-                            answer = generate_answer(full_prompt)
-                        else:
-                            answer = generate_answer(full_prompt, context_docs)
-                    except Exception as e:
-                        answer = f"Error generating response: {e}"
-                    finally:
-                        print(f"Answer: {answer}")
+                        lexical_index = load_lexical_index(st.session_state.user_id, st.session_state.session_id, vector_store)
+                        context_docs = query_documents(vector_store, prompt, k=5, lexical_index=lexical_index)
+                        if context_docs:
+                            context_docs, _ = pack_context(context_docs)
+
+                answer = ""
+                try:
+                    # Taking last 4 messages for conversation context
+                    recent_history = st.session_state.messages[-6:-2]
+
+                    # Format conversation history
+                    conversation_history = "\n".join([
+                        f"{msg['role'].capitalize()}: {msg['content']}" for msg in recent_history
+                    ])
+
+                    # Combine conversation + user prompt
+                    if conversation_history:
+                        full_prompt = f"{prompt}\n\n### Conversation History:\n{conversation_history}"
+                    else:
+                        full_prompt = prompt
+
+                    with st.spinner("Generating response..."):
+                        tokens = stream_answer(full_prompt, context_docs or None)
+                        first_token = next(tokens, "")
+                    answer = first_token
+                    message_placeholder.markdown(answer + "▌")
+                    for token in tokens:
+                        answer += token
+                        message_placeholder.markdown(answer + "▌")
+                    answer = answer.strip()
+                except Exception as e:
+                    answer = f"Error generating response: {e}"
+                finally:
+                    print(f"Answer: {answer}")
 
                 message_placeholder.markdown(answer)
                 st.session_state.messages.append({"role": "assistant", "content": answer})
 
-            update_conversation_in_db(st.session_state.session_id, st.session_state.messages)
+            append_messages(st.session_state.session_id, st.session_state.messages[-2:])
 
 
 if __name__ == "__main__":
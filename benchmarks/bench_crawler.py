@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.web_crawler import SiteCrawler
+from benchmarks.corpus import make_pages
+
+class SlowHandler(SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler already answers If-Modified-Since with 304.
+    latency_seconds = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency_seconds)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+def build_site(root, pages, links_per_page):
+    texts = make_pages(pages, seed=11, words_per_page=300)
+    for i, text in enumerate(texts):
+        targets = [(i * links_per_page + j + 1) % pages for j in range(links_per_page)]
+        links = "".join(f'<a href="{"/" if target == 0 else f"/page{target}.html"}">next</a>' for target in targets)
+        html = f"<html><head><title>Page {i}</title></head><body><p>{text}</p>{links}</body></html>"
+        name = "index.html" if i == 0 else f"page{i}.html"
+        with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+            f.write(html)
+    # The sitemap lists every page, so pages deeper than max_depth are still found.
+    locations = "".join(f"<url><loc>{{base}}/page{i}.html</loc></url>" for i in range(1, pages))
+    return '<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + locations + "</urlset>"
+
+def crawl(url, concurrency, max_pages, validators=None):
+    pages = []
+    crawler = SiteCrawler(url, max_pages=max_pages, max_depth=3, concurrency=concurrency, validators=validators)
+    start = time.perf_counter()
+    stats = asyncio.run(crawler.crawl(pages.append))
+    elapsed = time.perf_counter() - start
+    seen = stats["pages_fetched"] + stats["pages_unchanged"]
+    return pages, stats, elapsed, seen / elapsed if elapsed else 0.0
+
+def run(pages, links_per_page, latency_ms, concurrency):
+    with tempfile.TemporaryDirectory() as root:
+        sitemap = build_site(root, pages, links_per_page)
+        SlowHandler.latency_seconds = latency_ms / 1000
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(SlowHandler, directory=root))
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with open(os.path.join(root, "sitemap.xml"), "w", encoding="utf-8") as f:
+            f.write(sitemap.replace("{base}", base))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            print(f"Site: {pages} pages, {links_per_page} links per page, {latency_ms} ms server latency")
+            _, stats, elapsed, rate = crawl(f"{base}/", 1, pages)
+            print(f"Sequential crawl: {stats} in {elapsed:.2f} s ({rate:.1f} pages/s)")
+
+            fetched, stats, elapsed, rate = crawl(f"{base}/", concurrency, pages)
+            print(f"Concurrent crawl ({concurrency} workers): {stats} in {elapsed:.2f} s ({rate:.1f} pages/s)")
+
+            validators = {
+                page["url"]: {key: page[key] for key in ("etag", "last_modified", "content_hash", "links")}
+                for page in fetched
+            }
+            _, stats, elapsed, rate = crawl(f"{base}/", concurrency, pages, validators)
+            print(f"Re-crawl with conditional GETs: {stats} in {elapsed:.2f} s ({rate:.1f} pages/s)")
+        finally:
+            server.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the website crawler against a local HTTP server")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--links-per-page", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    run(args.pages, args.links_per_page, args.latency_ms, args.concurrency)
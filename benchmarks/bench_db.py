@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db_utils
+from benchmarks.bench_utils import summarize
+
+def reader(user_id, session_ids, operations, results, lock):
+    list_latencies = []
+    message_latencies = []
+    for _ in range(operations):
+        start = time.perf_counter()
+        db_utils.get_all_sessions_helper(user_id)
+        list_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db_utils.get_all_messages_helper(user_id, random.choice(session_ids))
+        message_latencies.append(time.perf_counter() - start)
+    with lock:
+        results["get_all_sessions_helper"].extend(list_latencies)
+        results["get_all_messages_helper"].extend(message_latencies)
+
+def writer(user_id, session_ids, operations, results, lock):
+    append_latencies = []
+    create_latencies = []
+    for i in range(operations):
+        turn = [{"role": "user", "content": f"question {i}"}, {"role": "assistant", "content": f"answer {i}"}]
+        start = time.perf_counter()
+        db_utils.append_messages(random.choice(session_ids), turn)
+        append_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        db_utils.create_session_record(user_id)
+        create_latencies.append(time.perf_counter() - start)
+    with lock:
+        results["append_messages"].extend(append_latencies)
+        results["create_session_record"].extend(create_latencies)
+
+def run(readers, writers, operations, sessions, verbose=True):
+    db_utils.init_db()
+    _, user_id = db_utils.add_user("bench", "Bench", "bench@example.com", "bench")
+    session_ids = [db_utils.create_session_record(user_id) for _ in range(sessions)]
+
+    results = {
+        "get_all_sessions_helper": [],
+        "get_all_messages_helper": [],
+        "append_messages": [],
+        "create_session_record": [],
+    }
+    lock = threading.Lock()
+    threads = [threading.Thread(target=reader, args=(user_id, session_ids, operations, results, lock)) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(user_id, session_ids, operations, results, lock)) for _ in range(writers)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(latencies) for latencies in results.values())
+    summaries = {helper: summarize(latencies) for helper, latencies in results.items()}
+    if verbose:
+        print(f"Readers: {readers}, writers: {writers}, operations per thread: {operations}, seeded sessions: {sessions}")
+        print(f"Throughput: {total / elapsed:.1f} ops/s ({total} operations in {elapsed:.2f} s)")
+        for helper, summary in summaries.items():
+            print(f"{helper}: {summary}")
+    return {
+        "readers": readers,
+        "writers": writers,
+        "operations_per_thread": operations,
+        "operations_per_second": round(total / elapsed, 2),
+        "helpers": summaries,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite helpers under concurrent readers and writers")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_utils.DB_PATH = os.path.join(workdir, "users.db")
+        run(args.readers, args.writers, args.operations, args.sessions)
@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.embeddings import EMBEDDING_BACKENDS, load_embeddings, vector_divergence
+from benchmarks.corpus import make_pages, make_questions
+
+CHUNK_CHARS = 1000
+
+def make_chunks(count):
+    chunks = []
+    for page in make_pages(count // 2 + 1, seed=21):
+        chunks.extend(page[i:i + CHUNK_CHARS] for i in range(0, len(page), CHUNK_CHARS))
+    return chunks[:count]
+
+def top_k(query_vector, chunk_vectors, k):
+    scores = [sum(a * b for a, b in zip(query_vector, vector)) for vector in chunk_vectors]
+    return set(sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:k])
+
+def bench_backend(backend, chunks, questions, batch_size):
+    start = time.perf_counter()
+    embeddings = load_embeddings(backend)
+    load_seconds = time.perf_counter() - start
+    embeddings.embed_documents(["warm up"])
+
+    start = time.perf_counter()
+    chunk_vectors = []
+    for i in range(0, len(chunks), batch_size):
+        chunk_vectors.extend(embeddings.embed_documents(chunks[i:i + batch_size]))
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query_vectors = [embeddings.embed_query(question) for question in questions]
+    query_seconds = time.perf_counter() - start
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "chunks_per_second": round(len(chunks) / embed_seconds, 1),
+        "query_ms": round(query_seconds / len(questions) * 1000, 2),
+    }, chunk_vectors, query_vectors
+
+def run(chunk_count, question_count, k, batch_size, backends):
+    chunks = make_chunks(chunk_count)
+    questions = make_questions(question_count, seed=22)
+    print(f"{len(chunks)} chunks, {len(questions)} queries, recall@{k} against the torch backend")
+
+    results = {}
+    reference = None
+    for backend in backends:
+        try:
+            result, chunk_vectors, query_vectors = bench_backend(backend, chunks, questions, batch_size)
+        except Exception as e:
+            print(f"{backend}: unavailable ({str(e)})")
+            continue
+
+        if reference is None and backend == "torch":
+            reference = (chunk_vectors, query_vectors, [top_k(q, chunk_vectors, k) for q in query_vectors])
+        if reference is not None:
+            reference_chunks, reference_queries, reference_hits = reference
+            hits = [top_k(q, chunk_vectors, k) for q in query_vectors]
+            result["recall_at_k"] = round(
+                sum(len(a & b) for a, b in zip(hits, reference_hits)) / (k * len(hits)), 4
+            )
+            result["max_divergence"] = round(vector_divergence(reference_chunks, chunk_vectors), 5)
+        results[backend] = result
+        print(f"{backend}: {result}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare embedding throughput and recall across backends")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS))
+    args = parser.parse_args()
+
+    run(args.chunks, args.questions, args.k, args.batch_size, args.backends.split(","))
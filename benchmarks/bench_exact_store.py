@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+from rag.exact_store import ExactStore, write_snapshot
+from benchmarks.bench_utils import summarize
+
+def random_vectors(rng, count, dimensions):
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def build_stores(workdir, chunks, dimensions, dtype):
+    rng = np.random.default_rng(7)
+    vectors = random_vectors(rng, chunks, dimensions)
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    documents = [f"chunk {i}" for i in range(chunks)]
+    metadatas = [{"source": f"doc-{i % 10}"} for i in range(chunks)]
+
+    client = chromadb.PersistentClient(path=f"{workdir}/chroma", settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection("bench")
+    for i in range(0, chunks, 1000):
+        collection.add(ids=ids[i:i + 1000], embeddings=vectors[i:i + 1000].tolist(),
+                       documents=documents[i:i + 1000], metadatas=metadatas[i:i + 1000])
+    write_snapshot(f"{workdir}/exact", ids, vectors, documents, metadatas, dtype=dtype)
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(backend, workdir, dimensions, queries, k, results):
+    # Runs in a fresh process so the open is cold and the RSS belongs to this backend alone.
+    query_vectors = random_vectors(np.random.default_rng(11), queries, dimensions)
+    rss_before = _peak_rss_mb()
+
+    start = time.perf_counter()
+    if backend == "chroma":
+        client = chromadb.PersistentClient(path=f"{workdir}/chroma", settings=Settings(anonymized_telemetry=False))
+        collection = client.get_collection("bench")
+        search = lambda vector: collection.query(query_embeddings=[vector.tolist()], n_results=k)
+    else:
+        store = ExactStore(f"{workdir}/exact")
+        search = lambda vector: store.similarity_search_by_vector_with_distance(vector, k=k)
+    search(query_vectors[0])
+    open_seconds = time.perf_counter() - start
+
+    latencies = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        search(vector)
+        latencies.append(time.perf_counter() - start)
+    results.put({
+        "open_ms": round(open_seconds * 1000, 2),
+        "query": summarize(latencies),
+        "rss_delta_mb": round(_peak_rss_mb() - rss_before, 1),
+    })
+
+def run_in_process(backend, workdir, dimensions, queries, k):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=measure, args=(backend, workdir, dimensions, queries, k, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def run(sizes, dimensions, queries, k, dtype):
+    report = {}
+    for chunks in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            build_stores(workdir, chunks, dimensions, dtype)
+            report[chunks] = {backend: run_in_process(backend, workdir, dimensions, queries, k)
+                              for backend in ("chroma", "exact")}
+        for backend, result in report[chunks].items():
+            print(f"{chunks} chunks, {backend}: open+first query {result['open_ms']} ms, "
+                  f"query p50 {result['query']['p50_ms']} ms / p99 {result['query']['p99_ms']} ms, "
+                  f"RSS +{result['rss_delta_mb']} MB")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Chroma with the memory-mapped exact-search store")
+    parser.add_argument("--sizes", default="500,2000,5000,20000")
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    args = parser.parse_args()
+
+    run([int(size) for size in args.sizes.split(",")], args.dimensions, args.queries, args.k, args.dtype)
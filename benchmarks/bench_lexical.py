@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.lexical_index import LexicalIndex, get_index_path, get_journal_path, save_index, load_index, update_index, drop_index
+from benchmarks.bench_utils import summarize
+from benchmarks.corpus import make_pages, make_vocabulary, get_page_identifier
+
+def run(chunks, words_per_chunk, vocabulary_size, queries, update_chunks, seed):
+    # Each page of the shared benchmark corpus is one chunk.
+    texts = make_pages(chunks + update_chunks, seed, words_per_page=words_per_chunk, vocabulary_size=vocabulary_size)
+    ids = [f"chunk-{i}" for i in range(len(texts))]
+    ids, update_ids = ids[:chunks], ids[chunks:]
+    texts, update_texts = texts[:chunks], texts[chunks:]
+    identifiers = [get_page_identifier(seed, page) for page in range(chunks)]
+    vocabulary = make_vocabulary(vocabulary_size)
+    weights = [1 / (rank + 1) for rank in range(vocabulary_size)]
+    rng = random.Random(seed + 1)
+
+    start = time.perf_counter()
+    index = LexicalIndex()
+    index.add(ids, texts)
+    build_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = get_index_path(workdir)
+        start = time.perf_counter()
+        save_index(index, path)
+        save_seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+
+        drop_index(path)
+        start = time.perf_counter()
+        index = load_index(path)
+        load_seconds = time.perf_counter() - start
+
+        # What one ingestion batch pays: patch the loaded index and append to its journal.
+        start = time.perf_counter()
+        update_index(index, path, update_ids, update_texts)
+        update_seconds = time.perf_counter() - start
+        journal_kb = os.path.getsize(get_journal_path(path)) / 1024 if os.path.exists(get_journal_path(path)) else 0.0
+
+    identifier_latencies = []
+    prose_latencies = []
+    for _ in range(queries):
+        query = f"what does {rng.choice(identifiers)} mean"
+        start = time.perf_counter()
+        index.search(query, k=20)
+        identifier_latencies.append(time.perf_counter() - start)
+
+        query = " ".join(rng.choices(vocabulary, weights=weights, k=5))
+        start = time.perf_counter()
+        index.search(query, k=20)
+        prose_latencies.append(time.perf_counter() - start)
+
+    print(f"Chunks: {chunks}, words per chunk: {words_per_chunk}, vocabulary: {vocabulary_size}")
+    print(f"Build: {build_seconds * 1000:.0f} ms, save: {save_seconds * 1000:.0f} ms, "
+          f"load: {load_seconds * 1000:.0f} ms, size: {size_mb:.1f} MB")
+    print(f"Update with {update_chunks} chunks: {update_seconds * 1000:.0f} ms, journal: {journal_kb:.0f} KB")
+    identifier_summary = summarize(identifier_latencies)
+    identifier_summary["max_ms"] = round(max(identifier_latencies) * 1000, 3)
+    prose_summary = summarize(prose_latencies)
+    prose_summary["max_ms"] = round(max(prose_latencies) * 1000, 3)
+    print(f"Identifier queries: {identifier_summary}")
+    print(f"Prose queries: {prose_summary}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark BM25 lexical index build and query latency")
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--words-per-chunk", type=int, default=150)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--update-chunks", type=int, default=64, help="chunks added in the timed incremental update")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args.chunks, args.words_per_chunk, args.vocabulary, args.queries, args.update_chunks, args.seed)
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_llm import start_fake_gemini_server
+from llm_gateway import LLMGateway, LLMTimeoutError
+from utils.metrics import llm_retries
+
+def make_client(base_url, timeout_seconds):
+    from google import genai
+    from google.genai import types
+    return genai.Client(api_key="fake", http_options=types.HttpOptions(timeout=int(timeout_seconds * 1000), base_url=base_url))
+
+async def burst(gateway, prompts):
+    start = time.perf_counter()
+    results = await asyncio.gather(*(gateway.generate(prompt) for prompt in prompts), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    timeouts = sum(isinstance(result, LLMTimeoutError) for result in results)
+    errors = sum(isinstance(result, Exception) for result in results) - timeouts
+    return elapsed, len(results) - timeouts - errors, timeouts, errors
+
+async def run_scenario(name, server, client, prompts, max_concurrency, timeout_seconds, max_retries):
+    gateway = LLMGateway(lambda: client, "gemini-2.5-flash", max_concurrency=max_concurrency,
+                         timeout_seconds=timeout_seconds, max_retries=max_retries)
+    requests_before, retries_before = server.requests, llm_retries.total()
+    elapsed, ok, timeouts, errors = await burst(gateway, prompts)
+    result = {
+        "calls": len(prompts),
+        "ok": ok,
+        "timeouts": timeouts,
+        "errors": errors,
+        "upstream_requests": server.requests - requests_before,
+        "retries": llm_retries.total() - retries_before,
+        "elapsed_seconds": round(elapsed, 2),
+    }
+    print(f"{name}: {result['ok']}/{result['calls']} ok ({result['timeouts']} timed out, {result['errors']} failed), "
+          f"{result['upstream_requests']} upstream requests, {result['retries']} retries, {result['elapsed_seconds']} s")
+    return result
+
+async def run(calls, latency_ms, failure_rate, max_concurrency, timeout_seconds, max_retries):
+    report = {}
+    server = start_fake_gemini_server(latency_ms=latency_ms)
+    client = make_client(server.base_url, timeout_seconds)
+    try:
+        same = ["What is the refund policy?"] * calls
+        distinct = [f"Question {i}" for i in range(calls)]
+        report["identical_prompts"] = await run_scenario(
+            "identical prompts", server, client, same, max_concurrency, timeout_seconds, max_retries)
+        report["distinct_prompts"] = await run_scenario(
+            "distinct prompts", server, client, distinct, max_concurrency, timeout_seconds, max_retries)
+
+        server.failure_rate = failure_rate
+        report["distinct_prompts_failing"] = await run_scenario(
+            f"distinct prompts, {failure_rate:.0%} upstream 503s", server, client, distinct,
+            max_concurrency, timeout_seconds, max_retries)
+        server.failure_rate = 0.0
+
+        # Upstream slower than the deadline: every attempt times out and is retried.
+        server.latency_ms = timeout_seconds * 2000
+        report["slow_upstream"] = await run_scenario(
+            "upstream slower than the deadline", server, client, distinct[:max_concurrency],
+            max_concurrency, timeout_seconds, max_retries)
+    finally:
+        server.shutdown()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise the LLM gateway against a local fake Gemini server")
+    parser.add_argument("--calls", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.2)
+    parser.add_argument("--max-concurrency", type=int, default=16)
+    parser.add_argument("--timeout-seconds", type=float, default=1.0)
+    parser.add_argument("--max-retries", type=int, default=2)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.calls, args.latency_ms, args.failure_rate, args.max_concurrency,
+                    args.timeout_seconds, args.max_retries))
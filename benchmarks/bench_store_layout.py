@@ -0,0 +1,123 @@
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from chromadb.config import Settings
+from benchmarks.bench_utils import summarize
+
+def random_vector(rng, dimensions):
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector]
+
+def make_session(rng, session_index, chunks, dimensions):
+    ids = [f"chunk-{session_index}-{i}" for i in range(chunks)]
+    vectors = [random_vector(rng, dimensions) for _ in range(chunks)]
+    documents = [f"session {session_index} chunk {i}" for i in range(chunks)]
+    return ids, vectors, documents
+
+def new_client(path):
+    return chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+
+def bench_directory_layout(workdir, sessions, rng, dimensions, queries):
+    for session_index, (ids, vectors, documents) in enumerate(sessions):
+        collection = new_client(f"{workdir}/session_{session_index}").create_collection(f"session_{session_index}")
+        collection.add(ids=ids, embeddings=vectors, documents=documents)
+
+    # Each path is opened for the first time here, so this is the cold open a request pays.
+    open_latencies = []
+    collections = []
+    for session_index in range(len(sessions)):
+        start = time.perf_counter()
+        collection = new_client(f"{workdir}/session_{session_index}").get_collection(f"session_{session_index}")
+        collection.query(query_embeddings=[random_vector(rng, dimensions)], n_results=5)
+        open_latencies.append(time.perf_counter() - start)
+        collections.append(collection)
+
+    query_latencies = []
+    for _ in range(queries):
+        collection = rng.choice(collections)
+        vector = random_vector(rng, dimensions)
+        start = time.perf_counter()
+        collection.query(query_embeddings=[vector], n_results=5)
+        query_latencies.append(time.perf_counter() - start)
+    return open_latencies, query_latencies
+
+def bench_shared_layout(workdir, sessions, rng, dimensions, queries, shards):
+    client = new_client(f"{workdir}/shared")
+    shard_collections = [client.create_collection(f"sessions_{shard:02d}") for shard in range(shards)]
+    for session_index, (ids, vectors, documents) in enumerate(sessions):
+        metadatas = [{"user_id": f"user-{session_index}", "session_id": "default"} for _ in ids]
+        shard_collections[session_index % shards].add(
+            ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas
+        )
+
+    def scoped_query(session_index, vector):
+        where = {"$and": [{"user_id": f"user-{session_index}"}, {"session_id": "default"}]}
+        shard_collections[session_index % shards].query(query_embeddings=[vector], n_results=5, where=where)
+
+    # The client is already open, so opening a session is just its first scoped query.
+    open_latencies = []
+    for session_index in range(len(sessions)):
+        start = time.perf_counter()
+        scoped_query(session_index, random_vector(rng, dimensions))
+        open_latencies.append(time.perf_counter() - start)
+
+    query_latencies = []
+    for _ in range(queries):
+        session_index = rng.randrange(len(sessions))
+        vector = random_vector(rng, dimensions)
+        start = time.perf_counter()
+        scoped_query(session_index, vector)
+        query_latencies.append(time.perf_counter() - start)
+    return open_latencies, query_latencies
+
+def count_files(path):
+    return sum(len(files) for _, _, files in os.walk(path))
+
+def run(session_count, chunks_per_session, dimensions, queries, shards, seed):
+    rng = random.Random(seed)
+    sessions = [make_session(rng, i, chunks_per_session, dimensions) for i in range(session_count)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        client_start = time.perf_counter()
+        new_client(f"{workdir}/warmup")
+        print(f"First client start-up (not counted): {(time.perf_counter() - client_start) * 1000:.0f} ms")
+
+        directory_open, directory_query = bench_directory_layout(
+            f"{workdir}/directory", sessions, random.Random(seed + 1), dimensions, queries
+        )
+        shared_open, shared_query = bench_shared_layout(
+            f"{workdir}/shared_layout", sessions, random.Random(seed + 1), dimensions, queries, shards
+        )
+
+        print(f"Sessions: {session_count}, chunks per session: {chunks_per_session}, shards: {shards}")
+        print(f"Directory layout files: {count_files(f'{workdir}/directory')}, "
+              f"shared layout files: {count_files(f'{workdir}/shared_layout')}")
+        print(f"Directory layout open + first query: {summarize(directory_open)}")
+        print(f"Shared layout open + first query: {summarize(shared_open)}")
+        print(f"Directory layout warm query: {summarize(directory_query)}")
+        print(f"Shared layout warm query: {summarize(shared_query)}")
+        print(f"Total time: {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare open time and query latency of per-session directories and the shared collection layout"
+    )
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--chunks-per-session", type=int, default=200)
+    parser.add_argument("--dimensions", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    run(args.sessions, args.chunks_per_session, args.dimensions, args.queries, args.shards, args.seed)
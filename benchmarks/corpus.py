@@ -0,0 +1,72 @@
+import random
+
+WORDS_PER_PAGE = 450
+LINES_PER_PAGE = 45
+VOCABULARY_SIZE = 5000
+
+def make_vocabulary(size=VOCABULARY_SIZE):
+    return [f"term{i}" for i in range(size)]
+
+def make_pages(pages, seed, words_per_page=WORDS_PER_PAGE, vocabulary_size=VOCABULARY_SIZE):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocabulary_size)
+    # Zipf-like weights so a few words are very common, like real prose.
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    result = []
+    for page in range(pages):
+        words = rng.choices(vocabulary, weights=weights, k=words_per_page)
+        words.insert(rng.randrange(len(words)), get_page_identifier(seed, page))
+        sentences = [" ".join(words[i:i + 15]).capitalize() + "." for i in range(0, len(words), 15)]
+        result.append(" ".join(sentences))
+    return result
+
+def get_page_identifier(seed, page):
+    # One made-up error code per page, for exact-match lookups.
+    return f"ERR_{seed}_{page}"
+
+def make_text(pages, seed):
+    return "\n\n".join(make_pages(pages, seed)).encode("utf-8")
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _wrap(text, lines):
+    words = text.split(" ")
+    per_line = max(1, len(words) // lines + 1)
+    return [" ".join(words[i:i + per_line]) for i in range(0, len(words), per_line)]
+
+def make_pdf(pages, seed):
+    # A minimal PDF 1.4 writer: one Helvetica text stream per page, enough for pypdf's
+    # text extraction without pulling a PDF library into the benchmark.
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in make_pages(pages, seed):
+        lines = _wrap(text, LINES_PER_PAGE)
+        stream = "BT /F1 9 Tf 11 TL 36 806 Td " + " ".join(f"({_escape_pdf_text(line)}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode("ascii")
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+def make_questions(count, seed):
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary()
+    return [f"what does {' '.join(rng.sample(vocabulary[:500], 3))} mean" for _ in range(count)]
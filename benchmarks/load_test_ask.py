@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import httpx
+import main
+import gemini_llm
+from utils.db_utils import init_db, add_user, create_session_record
+from benchmarks.bench_utils import summarize
+
+async def asker(client, user_id, session_id, questions, latencies):
+    for question in questions:
+        start = time.perf_counter()
+        response = await client.post("/ask_chatbot", json={"user_id": user_id, "session_id": session_id, "query": question})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+async def session_lister(client, user_id, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get(f"/users/{user_id}/get_all_sessions")
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+async def run(concurrency, questions, llm_latency_ms, user_id=None, sessions=None, verbose=True):
+    # The fake backend's client is created on first use, so the latency can still be set here.
+    gemini_llm.FAKE_LLM_LATENCY_MS = llm_latency_ms
+    if isinstance(questions, int):
+        questions = [f"question {i}" for i in range(questions)]
+
+    init_db()
+    if user_id is None:
+        _, user_id = add_user("loadtest", "Load Test", "loadtest@example.com", "loadtest")
+    if sessions is None:
+        sessions = [create_session_record(user_id) for _ in range(concurrency)]
+
+    ask_latencies = []
+    list_latencies = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        lister = asyncio.create_task(session_lister(client, user_id, stop, list_latencies))
+        start = time.perf_counter()
+        # Each asker's prompts are distinct, so the LLM gateway cannot coalesce them and
+        # every request runs the whole pipeline.
+        await asyncio.gather(*(
+            asker(client, user_id, session_id, [f"{question} (asker {n})" for question in questions], ask_latencies)
+            for n, session_id in enumerate(sessions)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await lister
+
+    total = len(sessions) * len(questions)
+    results = {
+        "concurrency": len(sessions),
+        "questions_per_asker": len(questions),
+        "llm_latency_ms": llm_latency_ms,
+        "requests_per_second": round(total / elapsed, 2),
+        "ask_chatbot": summarize(ask_latencies),
+        "get_all_sessions": summarize(list_latencies) if list_latencies else None,
+    }
+    if verbose:
+        print(f"Concurrent askers: {len(sessions)}, questions each: {len(questions)}, stub LLM latency: {llm_latency_ms} ms")
+        print(f"Throughput: {total / elapsed:.1f} req/s ({total} requests in {elapsed:.2f} s)")
+        print(f"/ask_chatbot latency: {results['ask_chatbot']}")
+        if list_latencies:
+            print(f"/get_all_sessions latency under load: {results['get_all_sessions']}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /ask_chatbot with a stubbed LLM")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(run(args.concurrency, args.questions, args.llm_latency_ms))
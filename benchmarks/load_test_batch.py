@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import httpx
+import main
+import gemini_llm
+from utils.db_utils import init_db, add_user, create_session_record
+
+async def ask_batch(client, user_id, session_id, questions, concurrency):
+    start = time.perf_counter()
+    answers = 0
+    done = None
+    payload = {"user_id": user_id, "session_id": session_id, "queries": questions, "concurrency": concurrency}
+    async with client.stream("POST", "/ask_chatbot/batch", json=payload) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event == "answer":
+                    answers += 1
+                elif event == "done":
+                    done = json.loads(line[len("data: "):])
+                event = None
+    return answers, time.perf_counter() - start, done
+
+async def run(questions, concurrency_levels, llm_latency_ms, verbose=True):
+    gemini_llm.FAKE_LLM_LATENCY_MS = llm_latency_ms
+    main.BATCH_ASK_CONCURRENCY = max(concurrency_levels)
+    questions = [f"question {i}" for i in range(questions)]
+
+    init_db()
+    _, user_id = add_user("batchtest", "Batch Test", "batchtest@example.com", "batchtest")
+    session_id = create_session_record(user_id)
+
+    results = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        for concurrency in concurrency_levels:
+            answers, elapsed, done = await ask_batch(client, user_id, session_id, questions, concurrency)
+            result = {
+                "concurrency": concurrency,
+                "questions": len(questions),
+                "answers_streamed": answers,
+                "answered": done["answered"] if done else 0,
+                "elapsed_seconds": round(elapsed, 2),
+                "questions_per_second": round(len(questions) / elapsed, 2),
+            }
+            results.append(result)
+            if verbose:
+                print(f"concurrency {concurrency}: {result['questions_per_second']} questions/s, "
+                      f"{result['answered']}/{len(questions)} answered in {result['elapsed_seconds']} s")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /ask_chatbot/batch throughput against its concurrency cap")
+    parser.add_argument("--questions", type=int, default=64)
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        asyncio.run(run(args.questions, [int(level) for level in args.concurrency.split(",")], args.llm_latency_ms))
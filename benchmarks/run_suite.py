@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("LLM_BACKEND", "fake")
+# The embedding model has to be in the local Hugging Face cache; never reach for the network.
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("WARMUP_EMBEDDINGS", "0")
+
+from rag import answer_cache
+from rag.embeddings import warm_up_embeddings, get_embedding_stats
+from rag.ingest_utils import InMemoryUpload
+from rag.document_rag import process_documents
+from utils.db_utils import init_db, add_user, create_session_record
+from benchmarks import bench_db, load_test_ask
+from benchmarks.corpus import make_pdf, make_text, make_questions
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def bench_ingestion(sizes, user_id):
+    results = []
+    largest_session = None
+    for pages in sizes:
+        session_id = create_session_record(user_id)
+        uploads = [
+            InMemoryUpload(f"corpus_{pages}.pdf", make_pdf(pages, seed=pages)),
+            InMemoryUpload(f"corpus_{pages}.txt", make_text(pages, seed=pages + 1)),
+        ]
+        progress = {}
+
+        def record(stage, **fields):
+            progress.update(fields)
+            progress["stage"] = stage
+
+        start = time.perf_counter()
+        vector_store = process_documents(uploads, user_id, session_id, progress=record)
+        elapsed = time.perf_counter() - start
+        if vector_store is None:
+            raise RuntimeError(f"Ingestion of the {pages} page corpus failed: {progress.get('error')}")
+
+        chunks = progress.get("chunks_total", 0)
+        results.append({
+            "pages": pages * 2,
+            "bytes": sum(len(upload.getvalue()) for upload in uploads),
+            "chunks": chunks,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(chunks / elapsed, 2) if elapsed else None,
+            "embed_chunks_per_second": progress.get("embed_chunks_per_second"),
+            "embedding_cache_hit_rate": progress.get("embedding_cache_hit_rate"),
+        })
+        print(f"Ingested {pages * 2} pages: {chunks} chunks in {elapsed:.2f} s ({results[-1]['chunks_per_second']} chunks/s)")
+        largest_session = session_id
+    return results, largest_session
+
+def run(args):
+    # Askers repeat the same questions, so the answer cache would skip the pipeline being measured.
+    answer_cache.ANSWER_CACHE_ENABLED = args.answer_cache
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": vars(args),
+    }
+
+    warm_up_embeddings()
+    report["embeddings"] = get_embedding_stats()
+
+    init_db()
+    _, user_id = add_user("suite", "Benchmark Suite", "suite@example.com", "suite")
+
+    report["ingestion"], session_id = bench_ingestion(args.sizes, user_id)
+
+    # Every asker queries the largest store, so the numbers include real retrieval.
+    questions = make_questions(args.questions, seed=args.seed)
+    report["ask"] = asyncio.run(load_test_ask.run(
+        args.concurrency, questions, args.llm_latency_ms,
+        user_id=user_id, sessions=[session_id] * args.concurrency, verbose=False
+    ))
+    print(f"/ask_chatbot: {report['ask']['ask_chatbot']}")
+
+    report["db"] = bench_db.run(args.db_readers, args.db_writers, args.db_operations, sessions=100, verbose=False)
+    print(f"DB helpers: {report['db']['operations_per_second']} ops/s")
+
+    report["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline end-to-end benchmark suite and write the results as JSON")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")], default=[5, 20, 80],
+                        help="comma-separated page counts for the synthetic PDF and text corpora")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on while asking")
+    parser.add_argument("--db-readers", type=int, default=8)
+    parser.add_argument("--db-writers", type=int, default=2)
+    parser.add_argument("--db-operations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        report = run(args)
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {output}")
@@ -0,0 +1,144 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Stands in for google.genai.Client with the same call shapes gemini_llm.py uses, so
+# the rest of the pipeline runs unchanged without an API key or network access.
+
+FAKE_STREAM_CHUNKS = 8
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+def fake_answer(contents):
+    return f"Stub answer generated from a {len(contents)} character prompt."
+
+def _split_stream(text):
+    words = text.split(" ")
+    size = max(1, len(words) // FAKE_STREAM_CHUNKS)
+    return [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+
+class FakeModels:
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency_ms / 1000)
+        return FakeResponse(fake_answer(contents))
+
+    def generate_content_stream(self, model, contents):
+        # The first chunk arrives after most of the latency, like a real time to first token.
+        pieces = _split_stream(fake_answer(contents))
+        time.sleep(self.latency_ms / 2000)
+        for piece in pieces:
+            time.sleep(self.latency_ms / 2000 / len(pieces))
+            yield FakeResponse(piece)
+
+class FakeAsyncModels:
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    async def generate_content(self, model, contents):
+        await asyncio.sleep(self.latency_ms / 1000)
+        return FakeResponse(fake_answer(contents))
+
+    async def _stream(self, contents):
+        pieces = _split_stream(fake_answer(contents))
+        await asyncio.sleep(self.latency_ms / 2000)
+        for piece in pieces:
+            await asyncio.sleep(self.latency_ms / 2000 / len(pieces))
+            yield FakeResponse(piece)
+
+    async def generate_content_stream(self, model, contents):
+        return self._stream(contents)
+
+class FakeAio:
+    def __init__(self, latency_ms):
+        self.models = FakeAsyncModels(latency_ms)
+
+class FakeClient:
+    def __init__(self, latency_ms=500):
+        self.models = FakeModels(latency_ms)
+        self.aio = FakeAio(latency_ms)
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    # Speaks enough of the Gemini REST API (generateContent and streamGenerateContent
+    # with alt=sse) for google.genai pointed at it through GEMINI_BASE_URL, so the real
+    # client, timeouts and retries can be exercised without network access.
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        try:
+            self._respond()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. on its deadline; nothing left to answer.
+            self.close_connection = True
+
+    def _respond(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+        with server.lock:
+            server.requests += 1
+            server.prompts[prompt] = server.prompts.get(prompt, 0) + 1
+        time.sleep(server.latency_ms / 1000)
+
+        if random.random() < server.failure_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}})
+            return
+
+        text = fake_answer(prompt)
+        if ":streamGenerateContent" not in self.path:
+            self._send_json(200, _candidate(text))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for piece in _split_stream(text):
+            self.wfile.write(f"data: {json.dumps(_candidate(piece))}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def _candidate(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}]}
+
+def start_fake_gemini_server(latency_ms=500, failure_rate=0.0, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), FakeGeminiHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.failure_rate = failure_rate
+    server.requests = 0
+    server.prompts = {}
+    server.lock = threading.Lock()
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini API (use with GEMINI_BASE_URL)")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = start_fake_gemini_server(args.latency_ms, args.failure_rate, port=args.port)
+    print(f"Fake Gemini API listening on {server.base_url}")
+    threading.Event().wait()
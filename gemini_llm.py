@@ -1,11 +1,59 @@
-from google import genai
 from dotenv import load_dotenv
 import os
+import logging
+import threading
+from rag.context_packer import estimate_tokens
+from llm_gateway import LLMGateway, LLM_TIMEOUT_SECONDS
+from utils.metrics import prompt_tokens, prompt_chunks
 
 load_dotenv()
-client = genai.Client(api_key=os.environ.get("GOOGLE_API_KEY"))
+GEMINI_MODEL = "gemini-2.5-flash"
+# "gemini" calls the API; "fake" answers locally after FAKE_LLM_LATENCY_MS, for benchmarks and offline runs.
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+FAKE_LLM_LATENCY_MS = float(os.environ.get("FAKE_LLM_LATENCY_MS", "500"))
+# Points the Gemini client somewhere else, e.g. the local fake server in fake_llm.py.
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL") or None
+# Prompts are only formatted and written when LOG_PROMPTS=1 (or the logger is set to DEBUG).
+LOG_PROMPTS = os.environ.get("LOG_PROMPTS", "0") == "1"
 
-def generate_answer(query, context_docs=None):
+prompt_logger = logging.getLogger("gemini_llm.prompts")
+if LOG_PROMPTS:
+    prompt_logger.setLevel(logging.DEBUG)
+    if not prompt_logger.handlers:
+        prompt_logger.addHandler(logging.StreamHandler())
+
+_client = None
+_client_lock = threading.Lock()
+_gateway = None
+
+def get_client():
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            if LLM_BACKEND == "fake":
+                from fake_llm import FakeClient
+                _client = FakeClient(latency_ms=FAKE_LLM_LATENCY_MS)
+            else:
+                from google import genai
+                from google.genai import types
+                _client = genai.Client(
+                    api_key=os.environ.get("GOOGLE_API_KEY"),
+                    http_options=types.HttpOptions(timeout=int(LLM_TIMEOUT_SECONDS * 1000), base_url=GEMINI_BASE_URL)
+                )
+    return _client
+
+def get_gateway():
+    global _gateway
+    if _gateway is not None:
+        return _gateway
+    with _client_lock:
+        if _gateway is None:
+            _gateway = LLMGateway(get_client, GEMINI_MODEL)
+    return _gateway
+
+def build_prompt(query, context_docs=None):
     if context_docs is None:
         prompt = f"""You are a helpful and trustworthy assistant.
 
@@ -31,6 +79,30 @@ Use the following context to answer the user's question as accurately as possibl
     {query}
     """
 
-    print(f"Final Prompt: {prompt}")
-    response = client.models.generate_content(model="gemini-2.5-flash",contents=prompt)
-    return response.text.strip()
+    return prompt
+
+def prepare_prompt(query, context_docs=None):
+    prompt = build_prompt(query, context_docs)
+    prompt_tokens.observe(estimate_tokens(prompt))
+    prompt_chunks.observe(len(context_docs or ()))
+    if prompt_logger.isEnabledFor(logging.DEBUG):
+        prompt_logger.debug("Final Prompt: %s", prompt)
+    return prompt
+
+def generate_answer(query, context_docs=None):
+    prompt = prepare_prompt(query, context_docs)
+    return get_gateway().generate_sync(prompt)
+
+def stream_answer(query, context_docs=None):
+    prompt = prepare_prompt(query, context_docs)
+    yield from get_gateway().stream_sync(prompt)
+
+
+async def agenerate_answer(query, context_docs=None):
+    prompt = prepare_prompt(query, context_docs)
+    return await get_gateway().generate(prompt)
+
+async def astream_answer(query, context_docs=None):
+    prompt = prepare_prompt(query, context_docs)
+    async for text in get_gateway().stream(prompt):
+        yield text
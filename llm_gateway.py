@@ -0,0 +1,276 @@
+import os
+import time
+import random
+import asyncio
+import hashlib
+import threading
+import httpx
+from utils.metrics import llm_upstream_seconds, llm_queue_wait_seconds, llm_queue_depth, llm_in_flight, llm_requests, llm_retries
+
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "16"))
+# Deadline for one upstream attempt; for streams, the longest wait for the next chunk.
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "60"))
+# Deadline for a whole call: queue wait, every attempt and the backoff between them.
+LLM_DEADLINE_SECONDS = float(os.environ.get("LLM_DEADLINE_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.environ.get("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.environ.get("LLM_RETRY_MAX_SECONDS", "8"))
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+class LLMTimeoutError(Exception):
+    pass
+
+def retry_reason(error):
+    if isinstance(error, (LLMTimeoutError, asyncio.TimeoutError, TimeoutError, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return "connection"
+    # google.genai's APIError carries the HTTP status as code.
+    code = getattr(error, "code", None)
+    if code in RETRYABLE_STATUS_CODES:
+        return str(code)
+    return None
+
+def backoff_seconds(attempt):
+    # Full jitter, so callers that failed together do not retry together.
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+class LLMGateway:
+    # Every LLM call goes through here. Identical prompts already in flight share one
+    # upstream call, at most max_concurrency calls run at once (the rest queue), and
+    # each attempt has a deadline and is retried with jittered backoff on timeouts,
+    # connection errors, 429s and 5xxs, all within one overall deadline per call.
+    def __init__(self, get_client, model, max_concurrency=LLM_MAX_CONCURRENCY,
+                 timeout_seconds=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES,
+                 deadline_seconds=LLM_DEADLINE_SECONDS):
+        self.get_client = get_client
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.deadline_seconds = deadline_seconds
+        self._loop = None
+        self._semaphore = None
+        self._in_flight = {}
+        # The async methods (the API) and the sync ones (the Streamlit app) each get
+        # max_concurrency slots. Each process only uses one kind, but a process mixing
+        # both could have up to twice that many calls upstream.
+        self._sync_semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def _loop_state(self):
+        # asyncio primitives belong to one event loop; benchmarks run several in turn.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._in_flight = {}
+        return self._semaphore, self._in_flight
+
+    def _deadline_error(self):
+        return LLMTimeoutError(f"LLM call did not finish within {self.deadline_seconds} s")
+
+    async def _acquire(self, semaphore, timeout=None):
+        llm_queue_depth.inc()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise self._deadline_error()
+        finally:
+            llm_queue_depth.dec()
+        llm_queue_wait_seconds.observe(time.perf_counter() - start)
+
+    def _acquire_sync(self, deadline):
+        llm_queue_depth.inc()
+        start = time.perf_counter()
+        try:
+            acquired = self._sync_semaphore.acquire(timeout=max(0.0, deadline - time.monotonic()))
+        finally:
+            llm_queue_depth.dec()
+        llm_queue_wait_seconds.observe(time.perf_counter() - start)
+        if not acquired:
+            raise self._deadline_error()
+
+    async def generate(self, prompt):
+        _, in_flight = self._loop_state()
+        key = hashlib.sha256(f"{self.model}\0{prompt}".encode("utf-8")).hexdigest()
+        task = in_flight.get(key)
+        if task is None:
+            llm_requests.inc(kind="generate", result="upstream")
+            task = asyncio.ensure_future(self._generate_with_retries(prompt))
+            in_flight[key] = task
+
+            def forget(finished):
+                in_flight.pop(key, None)
+                if not finished.cancelled():
+                    finished.exception()
+
+            task.add_done_callback(forget)
+        else:
+            llm_requests.inc(kind="generate", result="coalesced")
+        # One caller going away must not cancel the call the others are waiting on.
+        return await asyncio.shield(task)
+
+    async def _generate_with_retries(self, prompt):
+        try:
+            async with asyncio.timeout(self.deadline_seconds):
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        return await self._generate_once(prompt)
+                    except Exception as e:
+                        reason = retry_reason(e)
+                        if reason is None or attempt == self.max_retries:
+                            raise
+                        llm_retries.inc(reason=reason)
+                        await asyncio.sleep(backoff_seconds(attempt))
+        except TimeoutError:
+            # Only the overall deadline raises this; attempts raise LLMTimeoutError.
+            raise self._deadline_error()
+
+    async def _generate_once(self, prompt):
+        semaphore, _ = self._loop_state()
+        await self._acquire(semaphore)
+        llm_in_flight.inc()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await asyncio.wait_for(
+                self.get_client().aio.models.generate_content(model=self.model, contents=prompt),
+                timeout=self.timeout_seconds
+            )
+            outcome = "ok"
+            return response.text.strip()
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise LLMTimeoutError(f"LLM call timed out after {self.timeout_seconds} s")
+        finally:
+            llm_upstream_seconds.observe(time.perf_counter() - start, kind="generate", outcome=outcome)
+            llm_in_flight.dec()
+            semaphore.release()
+
+    async def stream(self, prompt):
+        # Streams are not coalesced, since every caller consumes its own chunks, and are
+        # only retried until the first chunk has been passed on.
+        llm_requests.inc(kind="stream", result="upstream")
+        semaphore, _ = self._loop_state()
+        # The overall deadline covers getting the stream going, so until the first chunk
+        # every wait is clipped to it; once chunks flow, each one only has to arrive
+        # within timeout_seconds of the last.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline_seconds
+
+        def wait_timeout():
+            if started:
+                return self.timeout_seconds
+            return max(0.0, min(self.timeout_seconds, deadline - loop.time()))
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(semaphore, timeout=max(0.0, deadline - loop.time()))
+            llm_in_flight.inc()
+            start = time.perf_counter()
+            outcome = "error"
+            started = False
+            error = None
+            try:
+                chunks = await asyncio.wait_for(
+                    self.get_client().aio.models.generate_content_stream(model=self.model, contents=prompt),
+                    timeout=wait_timeout()
+                )
+                iterator = chunks.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=wait_timeout())
+                    except StopAsyncIteration:
+                        break
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+                outcome = "ok"
+                return
+            except (GeneratorExit, asyncio.CancelledError):
+                outcome = "cancelled"
+                raise
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                if not started and loop.time() >= deadline:
+                    error = self._deadline_error()
+                else:
+                    error = LLMTimeoutError(f"LLM stream stalled for {self.timeout_seconds} s")
+            except Exception as e:
+                error = e
+            finally:
+                llm_upstream_seconds.observe(time.perf_counter() - start, kind="stream", outcome=outcome)
+                llm_in_flight.dec()
+                semaphore.release()
+
+            reason = retry_reason(error)
+            backoff = backoff_seconds(attempt)
+            if started or reason is None or attempt == self.max_retries or loop.time() + backoff >= deadline:
+                raise error
+            llm_retries.inc(reason=reason)
+            await asyncio.sleep(backoff)
+
+    def generate_sync(self, prompt):
+        # Used outside an event loop (the Streamlit app). There is no wait_for here, so
+        # each attempt's HTTP timeout is clipped to what is left of the overall deadline.
+        llm_requests.inc(kind="generate", result="upstream")
+        deadline = time.monotonic() + self.deadline_seconds
+        for attempt in range(self.max_retries + 1):
+            self._acquire_sync(deadline)
+            llm_in_flight.inc()
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                timeout_ms = max(1, int(min(self.timeout_seconds, deadline - time.monotonic()) * 1000))
+                response = self.get_client().models.generate_content(
+                    model=self.model, contents=prompt, config={"http_options": {"timeout": timeout_ms}}
+                )
+                outcome = "ok"
+                return response.text.strip()
+            except Exception as e:
+                reason = retry_reason(e)
+                if reason == "timeout" and time.monotonic() >= deadline:
+                    raise self._deadline_error() from e
+                backoff = backoff_seconds(attempt)
+                if reason is None or attempt == self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise
+            finally:
+                llm_upstream_seconds.observe(time.perf_counter() - start, kind="generate", outcome=outcome)
+                llm_in_flight.dec()
+                self._sync_semaphore.release()
+            llm_retries.inc(reason=reason)
+            time.sleep(backoff)
+
+    def stream_sync(self, prompt):
+        # The deadline bounds queue wait and when attempts may start. An attempt's HTTP
+        # timeout also bounds every later chunk, so it is not clipped: a started attempt
+        # can run up to the client's timeout past the deadline before its first chunk.
+        llm_requests.inc(kind="stream", result="upstream")
+        deadline = time.monotonic() + self.deadline_seconds
+        for attempt in range(self.max_retries + 1):
+            self._acquire_sync(deadline)
+            llm_in_flight.inc()
+            start = time.perf_counter()
+            outcome = "error"
+            started = False
+            try:
+                for chunk in self.get_client().models.generate_content_stream(model=self.model, contents=prompt):
+                    if chunk.text:
+                        started = True
+                        yield chunk.text
+                outcome = "ok"
+                return
+            except GeneratorExit:
+                outcome = "cancelled"
+                raise
+            except Exception as e:
+                reason = retry_reason(e)
+                backoff = backoff_seconds(attempt)
+                if started or reason is None or attempt == self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise
+            finally:
+                llm_upstream_seconds.observe(time.perf_counter() - start, kind="stream", outcome=outcome)
+                llm_in_flight.dec()
+                self._sync_semaphore.release()
+            llm_retries.inc(reason=reason)
+            time.sleep(backoff)
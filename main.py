@@ -1,14 +1,51 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse
 import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from typing import List, Dict, Any
-from rag.document_rag import load_vector_store, query_documents, delete_vector_store
-from gemini_llm import generate_answer
-from utils.db_utils import update_conversation_in_db, get_all_messages_helper, get_session_details_helper, get_all_sessions_helper, get_all_users_helper, delete_session_helper, verify_user, add_user
+from rag.document_rag import process_documents, load_vector_store, load_lexical_index, query_documents_batch, delete_vector_store
+from rag.embeddings import warm_up_embeddings, get_embedding_stats, get_query_cache_stats
+from rag.store_manager import get_store_cache_stats
+from rag.ingest_utils import InMemoryUpload
+from rag.shared_sources import session_has_sources, list_session_sources, remove_session_source
+from rag.store_lifecycle import start_store_lifecycle, stop_store_lifecycle
+from rag.embedding_cache import get_embedding_cache_stats
+from rag.context_packer import pack_context
+from rag.answer_cache import lookup_answer, store_answer, get_answer_cache_stats
+from rag.website_rag import process_website
+from rag.video_rag import process_youtube
+from gemini_llm import agenerate_answer, astream_answer
+from utils.db_utils import init_db, get_session_settings_helper, update_session_settings_helper, append_messages_helper, get_all_messages_helper, ensure_session_helper, get_session_details_helper, get_all_sessions_helper, get_session_summaries_helper, get_all_users_helper, get_users_page_helper, delete_session_helper, verify_user, add_user
+from utils.async_utils import run_in_rag_executor, run_in_db_executor, shutdown_executors
+from utils.metrics import timed, record_stage, start_request_timing, format_server_timing, request_seconds, render_metrics
+from utils.job_queue import submit_job, get_job, get_session_jobs, shutdown_job_queue
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from schemas.auth_schemas import LoginRequest, LoginResponse, RegisterRequest, RegisterResponse
-from schemas.session_schemas import AskRequest, AskResponse, DelSessionResponse, VSExistsResponse, UserDetails, SessionDetails, Message
-    
-app = FastAPI()
+from schemas.session_schemas import AskRequest, AskBatchRequest, AskResponse, SessionSettings, DelSessionResponse, VSExistsResponse, UserDetails, SessionDetails, Message, SessionSummaryPage, UserPage
+from schemas.system_schemas import EmbeddingStatsResponse, CacheStatsResponse, EmbeddingCacheStatsResponse, AnswerCacheStatsResponse
+from schemas.ingestion_schemas import IngestUrlRequest, IngestJobResponse, IngestionJobStatus, SourceDetails, RemoveSourceResponse
+
+WARMUP_EMBEDDINGS = os.environ.get("WARMUP_EMBEDDINGS", "1") == "1"
+BATCH_ASK_MAX_QUERIES = int(os.environ.get("BATCH_ASK_MAX_QUERIES", "500"))
+# Upper bound on concurrent LLM calls per batch request; requests may ask for fewer.
+BATCH_ASK_CONCURRENCY = int(os.environ.get("BATCH_ASK_CONCURRENCY", "8"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    if WARMUP_EMBEDDINGS:
+        warm_up_embeddings()
+    start_store_lifecycle()
+    yield
+    stop_store_lifecycle()
+    shutdown_job_queue()
+    shutdown_executors()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,110 +54,404 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Starlette leaves text/event-stream responses uncompressed, so SSE is unaffected.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 DB_PATH = "users.db"
 
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    timings = start_request_timing()
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    request_seconds.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    # Streaming responses send headers before generation, so they only carry the stages before it.
+    if timings:
+        response.headers["Server-Timing"] = format_server_timing(timings)
+    return response
+
+def compact_json_response(model, data):
+    # Serialize straight from pydantic-core instead of going through jsonable_encoder.
+    return Response(content=model.model_validate(data).model_dump_json(), media_type="application/json")
+
 @app.get("/")
-def base():
+async def base():
     return {"status": "ok", "message": "FastAPI running successfully"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/embeddings/stats", response_model=EmbeddingStatsResponse)
+async def embedding_stats():
+    return get_embedding_stats()
+
+@app.get("/embeddings/query_cache_stats", response_model=CacheStatsResponse)
+async def query_cache_stats():
+    return get_query_cache_stats()
+
+@app.get("/embeddings/chunk_cache_stats", response_model=EmbeddingCacheStatsResponse)
+async def chunk_embedding_cache_stats():
+    return get_embedding_cache_stats()
+
+@app.get("/vector_stores/cache_stats", response_model=CacheStatsResponse)
+async def vector_store_cache_stats():
+    return get_store_cache_stats()
+
+@app.get("/answers/cache_stats", response_model=AnswerCacheStatsResponse)
+async def answer_cache_stats():
+    return get_answer_cache_stats()
+
 @app.get("/users/{user_id}/{session_id}/get_messages", response_model=List[Message])
-def get_all_messages(user_id: str, session_id: str):
+async def get_all_messages(user_id: str, session_id: str, last_n: int | None = None):
     try:
-        return get_all_messages_helper(user_id, session_id)
+        return await run_in_db_executor(get_all_messages_helper, user_id, session_id, last_n)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/users/{user_id}/{session_id}/get_session_details", response_model=SessionDetails)
-def get_session_details(user_id: str, session_id: str):
+async def get_session_details(user_id: str, session_id: str):
     try:
-        return get_session_details_helper(user_id, session_id)
+        return await run_in_db_executor(get_session_details_helper, user_id, session_id)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+@app.get("/users/{user_id}/{session_id}/settings", response_model=SessionSettings)
+async def get_session_settings(user_id: str, session_id: str):
+    try:
+        return await run_in_db_executor(get_session_settings_helper, user_id, session_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.put("/users/{user_id}/{session_id}/settings", response_model=SessionSettings)
+async def update_session_settings(user_id: str, session_id: str, settings: SessionSettings):
+    try:
+        return await run_in_db_executor(update_session_settings_helper, user_id, session_id, settings.answer_cache)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
 @app.get("/users/{user_id}/get_all_sessions", response_model=List[SessionDetails])
-def get_all_sessions(user_id: str):
+async def get_all_sessions(user_id: str):
     try:
-        return get_all_sessions_helper(user_id)
+        return await run_in_db_executor(get_all_sessions_helper, user_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.get("/users/{user_id}/sessions", response_model=SessionSummaryPage)
+async def get_session_summaries(user_id: str, limit: int = Query(20, ge=1, le=200), cursor: str | None = None):
+    try:
+        page = await run_in_db_executor(get_session_summaries_helper, user_id, limit, cursor)
+        return compact_json_response(SessionSummaryPage, page)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.get("/users", response_model=UserPage)
+async def get_users(limit: int = Query(50, ge=1, le=500), cursor: str | None = None):
+    try:
+        page = await run_in_db_executor(get_users_page_helper, limit, cursor)
+        return compact_json_response(UserPage, page)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.get("/get_all_users", response_model=List[UserDetails])
-def get_all_users():
+async def get_all_users():
     try:
-        return get_all_users_helper()
+        return await run_in_db_executor(get_all_users_helper)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
     
 @app.get("/users/{user_id}/{session_id}/vector_store_exists", response_model = VSExistsResponse)
-def vector_store_exists(user_id: str, session_id: str):
+async def vector_store_exists(user_id: str, session_id: str):
     try:
-        path = f"vector_store/{user_id}_{session_id}"
-        return {"exists": os.path.exists(path)}
+        return {"exists": await run_in_rag_executor(session_has_sources, user_id, session_id)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
     
+def retrieve_contexts(user_id, session_id, queries):
+    # One store and lexical index load, and one embedding call, for all queries.
+    with timed("load_store"):
+        vector_store = load_vector_store(user_id, store_name=session_id)
+    if not vector_store:
+        return [([], None) for _ in queries]
+    with timed("load_lexical_index"):
+        lexical_index = load_lexical_index(user_id, session_id, vector_store)
+
+    contexts = []
+    for context_docs in query_documents_batch(vector_store, queries, k=5, lexical_index=lexical_index):
+        if not context_docs:
+            contexts.append(([], None))
+            continue
+        with timed("pack_context"):
+            contexts.append(pack_context(context_docs))
+    return contexts
+
+def retrieve_context(user_id, session_id, query):
+    return retrieve_contexts(user_id, session_id, [query])[0]
+
+async def answer_with_cache(query, context_docs, use_cache):
+    if use_cache:
+        with timed("answer_cache"):
+            answer = await run_in_rag_executor(lookup_answer, query, context_docs)
+        if answer is not None:
+            return answer, True
+    start = time.perf_counter()
+    with timed("llm"):
+        answer = await agenerate_answer(query, context_docs or None)
+    if use_cache:
+        generation_ms = (time.perf_counter() - start) * 1000
+        await run_in_rag_executor(store_answer, query, context_docs, answer, generation_ms)
+    return answer, False
+
 @app.post("/ask_chatbot", response_model = AskResponse)
-def ask_chatbot(ask : AskRequest):
+async def ask_chatbot(ask : AskRequest):
     try:
         user_id = ask.user_id
         session_id = ask.session_id
         query = ask.query
-        messages = get_all_messages(user_id, session_id)
-        context_docs = []
-        if vector_store_exists(user_id, session_id)["exists"] == True:
-            vector_store = load_vector_store(user_id, store_name=session_id)
-            if vector_store:
-                context_docs = query_documents(vector_store, query, k=5)
+        with timed("session_lookup"):
+            settings = await run_in_db_executor(get_session_settings_helper, user_id, session_id)
+        context_docs, context_stats = await run_in_rag_executor(retrieve_context, user_id, session_id, query)
         try:
-            if not context_docs:
-                answer = generate_answer(query)
-            else:
-                answer = generate_answer(query, context_docs)
+            answer, cached = await answer_with_cache(query, context_docs, settings["answer_cache"])
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to generate answer: {str(e)}")
-        messages.append({"role": "user", "content": query})
-        messages.append({"role": "assistant", "content": answer})
-        update_conversation_in_db(session_id, messages)
-        return { "success": True, "answer": answer }
+        messages = [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+        with timed("save_messages"):
+            await run_in_db_executor(append_messages_helper, user_id, session_id, messages)
+        return { "success": True, "answer": answer, "cached": cached, "context_stats": context_stats }
     except HTTPException as e:
         raise e       
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    if event:
+        payload = f"event: {event}\n{payload}"
+    return payload
+
+@app.post("/ask_chatbot/stream")
+async def ask_chatbot_stream(ask : AskRequest):
+    try:
+        user_id = ask.user_id
+        session_id = ask.session_id
+        query = ask.query
+        with timed("session_lookup"):
+            settings = await run_in_db_executor(get_session_settings_helper, user_id, session_id)
+        context_docs, context_stats = await run_in_rag_executor(retrieve_context, user_id, session_id, query)
+        cached_answer = None
+        if settings["answer_cache"]:
+            with timed("answer_cache"):
+                cached_answer = await run_in_rag_executor(lookup_answer, query, context_docs)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+    async def event_stream():
+        if cached_answer is not None:
+            answer = cached_answer
+            yield sse_event({"token": answer})
+        else:
+            tokens = []
+            start = time.perf_counter()
+            try:
+                async for token in astream_answer(query, context_docs or None):
+                    if not tokens:
+                        record_stage("llm_first_token", time.perf_counter() - start)
+                    tokens.append(token)
+                    yield sse_event({"token": token})
+            except Exception as e:
+                yield sse_event({"detail": f"Failed to generate answer: {str(e)}"}, event="error")
+                return
+            record_stage("llm", time.perf_counter() - start)
+            answer = "".join(tokens).strip()
+            if settings["answer_cache"]:
+                generation_ms = (time.perf_counter() - start) * 1000
+                await run_in_rag_executor(store_answer, query, context_docs, answer, generation_ms)
+        messages = [{"role": "user", "content": query}, {"role": "assistant", "content": answer}]
+        with timed("save_messages"):
+            await run_in_db_executor(append_messages_helper, user_id, session_id, messages)
+        yield sse_event({"success": True, "answer": answer, "cached": cached_answer is not None,
+                         "context_stats": context_stats}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
     
+@app.post("/ask_chatbot/batch")
+async def ask_chatbot_batch(ask : AskBatchRequest):
+    try:
+        if not ask.queries:
+            raise HTTPException(status_code=400, detail="No queries given")
+        if len(ask.queries) > BATCH_ASK_MAX_QUERIES:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_ASK_MAX_QUERIES} queries per batch")
+        with timed("session_lookup"):
+            settings = await run_in_db_executor(get_session_settings_helper, ask.user_id, ask.session_id)
+        contexts = await run_in_rag_executor(retrieve_contexts, ask.user_id, ask.session_id, ask.queries)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+    concurrency = max(1, min(ask.concurrency or BATCH_ASK_CONCURRENCY, BATCH_ASK_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer_one(index):
+        query = ask.queries[index]
+        context_docs, context_stats = contexts[index]
+        async with semaphore:
+            try:
+                answer, cached = await answer_with_cache(query, context_docs, settings["answer_cache"])
+            except Exception as e:
+                return {"index": index, "query": query, "success": False, "detail": f"Failed to generate answer: {str(e)}"}
+        return {"index": index, "query": query, "success": True, "answer": answer, "cached": cached,
+                "context_stats": context_stats}
+
+    async def event_stream():
+        # Answers are sent as they complete; index ties each one back to its query.
+        start = time.perf_counter()
+        tasks = [asyncio.create_task(answer_one(index)) for index in range(len(ask.queries))]
+        results = []
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                results.append(result)
+                yield sse_event(result, event="answer")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        answered = sorted((result for result in results if result["success"]), key=lambda result: result["index"])
+        if ask.save_messages and answered:
+            messages = []
+            for result in answered:
+                messages.extend([{"role": "user", "content": result["query"]},
+                                 {"role": "assistant", "content": result["answer"]}])
+            with timed("save_messages"):
+                await run_in_db_executor(append_messages_helper, ask.user_id, ask.session_id, messages)
+        yield sse_event({"success": True, "answered": len(answered), "failed": len(results) - len(answered),
+                         "concurrency": concurrency, "elapsed_seconds": round(time.perf_counter() - start, 2)},
+                        event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/users/{user_id}/{session_id}/ingest/documents", response_model=IngestJobResponse)
+async def ingest_documents(user_id: str, session_id: str, files: List[UploadFile] = File(...)):
+    try:
+        await run_in_db_executor(ensure_session_helper, user_id, session_id)
+        uploads = [InMemoryUpload(file.filename, await file.read()) for file in files]
+        job_id = submit_job("documents", user_id, session_id, process_documents, uploads, user_id, session_id)
+        return {"job_id": job_id, "status": "queued"}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.post("/users/{user_id}/{session_id}/ingest/website", response_model=IngestJobResponse)
+async def ingest_website(user_id: str, session_id: str, ingest: IngestUrlRequest):
+    try:
+        await run_in_db_executor(ensure_session_helper, user_id, session_id)
+        job_id = submit_job("website", user_id, session_id, process_website, ingest.url, user_id, session_id)
+        return {"job_id": job_id, "status": "queued"}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.post("/users/{user_id}/{session_id}/ingest/youtube", response_model=IngestJobResponse)
+async def ingest_youtube(user_id: str, session_id: str, ingest: IngestUrlRequest):
+    try:
+        await run_in_db_executor(ensure_session_helper, user_id, session_id)
+        job_id = submit_job("youtube", user_id, session_id, process_youtube, ingest.url, user_id, session_id)
+        return {"job_id": job_id, "status": "queued"}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.get("/ingest/jobs/{job_id}", response_model=IngestionJobStatus)
+async def get_ingestion_job(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
+@app.get("/users/{user_id}/{session_id}/ingest/jobs", response_model=List[IngestionJobStatus])
+async def get_ingestion_jobs(user_id: str, session_id: str):
+    return get_session_jobs(user_id, session_id)
+
+@app.get("/users/{user_id}/{session_id}/sources", response_model=List[SourceDetails])
+async def get_sources(user_id: str, session_id: str):
+    try:
+        return await run_in_rag_executor(list_session_sources, user_id, session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.delete("/users/{user_id}/{session_id}/sources", response_model=RemoveSourceResponse)
+async def delete_source(user_id: str, session_id: str, source: str):
+    try:
+        await run_in_db_executor(ensure_session_helper, user_id, session_id)
+        chunks_removed = await run_in_rag_executor(remove_session_source, user_id, session_id, source)
+        return {"success": chunks_removed > 0, "chunks_removed": chunks_removed}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
 @app.delete("/users/{user_id}/{session_id}/delete_session", response_model=DelSessionResponse)
-def delete_session(user_id: str, session_id: str):
+async def delete_session(user_id: str, session_id: str):
     try:
-        get_session_details(user_id, session_id)
-        if(vector_store_exists(user_id, session_id)["exists"] == True):
-            delete_vector_store(user_id, session_id)
-        return delete_session_helper(user_id, session_id)
+        await run_in_db_executor(ensure_session_helper, user_id, session_id)
+        if await run_in_rag_executor(session_has_sources, user_id, session_id):
+            await run_in_rag_executor(delete_vector_store, user_id, session_id)
+        return await run_in_db_executor(delete_session_helper, user_id, session_id)
     except HTTPException as e:
             raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
     
 @app.post("/login", response_model=LoginResponse)
-def login_user(login: LoginRequest):
+async def login_user(login: LoginRequest):
     try:
-        success, name, username, user_id =  verify_user(login.username, login.password)
+        success, name, username, user_id = await run_in_db_executor(verify_user, login.username, login.password)
         return { "success": success, "name": name, "username": username, "user_id": user_id }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 @app.post("/register", response_model=RegisterResponse)
-def register_user(register: RegisterRequest):
+async def register_user(register: RegisterRequest):
     try:
-        status, user_id = add_user(register.username, register.name, register.email, register.password)
+        status, user_id = await run_in_db_executor(add_user, register.username, register.name, register.email, register.password)
         return { "status" : status, "user_id" : user_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
@@ -0,0 +1,83 @@
+import os
+import hashlib
+import threading
+from rag.embeddings import embed_query_cached, get_embedding_model_id
+from utils.cache_utils import LRUCache
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Paraphrases kept per retrieved context; the oldest is dropped past this.
+ANSWER_CACHE_QUERIES_PER_CONTEXT = 8
+
+# Entries are keyed by the sources and the exact context that was retrieved, so a hit
+# can only reuse an answer that Gemini produced from the same text. Each entry holds
+# the (query vector, answer, generation time) of questions already answered with it.
+_answer_cache = LRUCache(max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=ANSWER_CACHE_TTL_SECONDS)
+_answer_cache_lock = threading.Lock()
+_answer_stats = {"lookups": 0, "hits": 0, "time_saved_ms": 0.0}
+
+def get_source_fingerprint(context_docs):
+    sources = sorted({str(doc.metadata.get("source", "")) for doc in context_docs or ()})
+    return hashlib.sha256("\0".join(sources).encode("utf-8")).hexdigest()
+
+def get_context_fingerprint(context_docs):
+    digest = hashlib.sha256(get_embedding_model_id().encode("utf-8"))
+    for doc in context_docs or ():
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+def _cache_key(context_docs):
+    return (get_source_fingerprint(context_docs), get_context_fingerprint(context_docs))
+
+def _similarity(left, right):
+    # Query embeddings are normalized, so the dot product is the cosine similarity.
+    return sum(a * b for a, b in zip(left, right))
+
+def lookup_answer(query, context_docs=None):
+    # Only grounded answers are cached; without retrieved context there is nothing
+    # to tie the answer to.
+    if not ANSWER_CACHE_ENABLED or not context_docs:
+        return None
+    query_vector = embed_query_cached(query)
+    key = _cache_key(context_docs)
+
+    with _answer_cache_lock:
+        _answer_stats["lookups"] += 1
+        entries = _answer_cache.get(key) or []
+        best = max(entries, key=lambda entry: _similarity(query_vector, entry[0]), default=None)
+        if best is None or _similarity(query_vector, best[0]) < ANSWER_CACHE_THRESHOLD:
+            return None
+        _answer_stats["hits"] += 1
+        _answer_stats["time_saved_ms"] += best[2]
+        return best[1]
+
+def store_answer(query, context_docs, answer, generation_ms):
+    if not ANSWER_CACHE_ENABLED or not context_docs or not answer:
+        return
+    query_vector = embed_query_cached(query)
+    key = _cache_key(context_docs)
+
+    with _answer_cache_lock:
+        entries = list(_answer_cache.get(key) or [])
+        entries.append((query_vector, answer, generation_ms))
+        _answer_cache.put(key, entries[-ANSWER_CACHE_QUERIES_PER_CONTEXT:])
+
+def get_answer_cache_stats():
+    with _answer_cache_lock:
+        cache_stats = _answer_cache.stats()
+        lookups = _answer_stats["lookups"]
+        hits = _answer_stats["hits"]
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "threshold": ANSWER_CACHE_THRESHOLD,
+            "entries": cache_stats["entries"],
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "time_saved_ms": round(_answer_stats["time_saved_ms"], 2),
+            "evictions": cache_stats["evictions"],
+            "expirations": cache_stats["expirations"],
+        }
@@ -0,0 +1,131 @@
+import os
+import re
+from langchain_core.documents import Document
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "2000"))
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+# Gemini does not ship a local tokenizer; ~4 characters per token is close for English text.
+CHARS_PER_TOKEN = 4
+# Chunks without a start_index (stores ingested before it was recorded) are joined by
+# matching one's tail to the next one's head; the splitter overlap is at most 200 characters.
+MAX_TEXT_OVERLAP = 400
+MIN_TEXT_OVERLAP = 20
+MIN_TRUNCATED_TOKENS = 50
+
+WORD_PATTERN = re.compile(r"\w+")
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def _span_key(doc):
+    return (str(doc.metadata.get("source", "")), doc.metadata.get("page"))
+
+def _text_overlap(left, right):
+    for size in range(min(len(left), len(right), MAX_TEXT_OVERLAP), MIN_TEXT_OVERLAP - 1, -1):
+        if right.startswith(left[-size:]):
+            return size
+    return 0
+
+def _try_merge(span, doc):
+    # Returns the merged text when doc overlaps or directly follows the span, else None.
+    start = doc.metadata.get("start_index")
+    if start is not None and span["start"] is not None:
+        span_end = span["start"] + len(span["text"])
+        if span["start"] <= start <= span_end:
+            return span["text"] + doc.page_content[span_end - start:]
+        doc_end = start + len(doc.page_content)
+        if start <= span["start"] <= doc_end:
+            return doc.page_content + span["text"][doc_end - span["start"]:]
+        return None
+
+    overlap = _text_overlap(span["text"], doc.page_content)
+    if overlap:
+        return span["text"] + doc.page_content[overlap:]
+    overlap = _text_overlap(doc.page_content, span["text"])
+    if overlap:
+        return doc.page_content + span["text"][overlap:]
+    return None
+
+def merge_adjacent_chunks(docs):
+    spans = []
+    for rank, doc in enumerate(docs):
+        if doc.page_content in (span["text"] for span in spans):
+            continue
+        for span in spans:
+            if span["key"] != _span_key(doc):
+                continue
+            merged = _try_merge(span, doc)
+            if merged is not None:
+                start = doc.metadata.get("start_index")
+                if span["start"] is not None and start is not None:
+                    span["start"] = min(span["start"], start)
+                span["text"] = merged
+                break
+        else:
+            spans.append({
+                "key": _span_key(doc),
+                "start": doc.metadata.get("start_index"),
+                "text": doc.page_content,
+                "rank": rank,
+                "doc": doc,
+            })
+    return spans
+
+def _word_set(text):
+    return set(WORD_PATTERN.findall(text.lower()))
+
+def drop_near_duplicates(spans):
+    kept = []
+    kept_words = []
+    for span in spans:
+        words = _word_set(span["text"])
+        duplicate = False
+        for other in kept_words:
+            union = len(words | other)
+            if union and len(words & other) / union >= NEAR_DUPLICATE_THRESHOLD:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(span)
+            kept_words.append(words)
+    return kept
+
+def _truncate(text, max_tokens):
+    text = text[:max_tokens * CHARS_PER_TOKEN]
+    cut = max(text.rfind(". "), text.rfind("\n"))
+    if cut > len(text) // 2:
+        return text[:cut + 1]
+    return text.rsplit(" ", 1)[0]
+
+def pack_context(docs, token_budget=None):
+    token_budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    tokens_in = sum(estimate_tokens(doc.page_content) for doc in docs)
+
+    # Spans keep the rank of their most relevant chunk, so the budget is spent in relevance order.
+    spans = drop_near_duplicates(merge_adjacent_chunks(docs))
+    spans.sort(key=lambda span: span["rank"])
+
+    packed = []
+    remaining = token_budget
+    for span in spans:
+        text = span["text"]
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_TRUNCATED_TOKENS and packed:
+                break
+            text = _truncate(text, remaining)
+            tokens = estimate_tokens(text)
+        packed.append(Document(page_content=text, metadata=dict(span["doc"].metadata), id=span["doc"].id))
+        remaining -= tokens
+        if remaining <= 0:
+            break
+
+    tokens_out = sum(estimate_tokens(doc.page_content) for doc in packed)
+    stats = {
+        "chunks_in": len(docs),
+        "chunks_out": len(packed),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "tokens_saved": tokens_in - tokens_out,
+    }
+    return packed, stats
@@ -0,0 +1,21 @@
+import io
+from pypdf import PdfReader
+from langchain_core.documents import Document
+
+# Kept free of heavy imports: this module is loaded by every parse worker process.
+
+def parse_document(name, data):
+    lower_name = name.lower()
+    if lower_name.endswith(".pdf"):
+        reader = PdfReader(io.BytesIO(data))
+        total_pages = len(reader.pages)
+        docs = []
+        for page_number, page in enumerate(reader.pages):
+            docs.append(Document(
+                page_content=page.extract_text() or "",
+                metadata={"source": name, "page": page_number, "total_pages": total_pages}
+            ))
+        return docs
+    elif lower_name.endswith((".txt", ".md")):
+        return [Document(page_content=data.decode("utf-8"), metadata={"source": name})]
+    return []
@@ -1,130 +1,211 @@
 import os
-import tempfile
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-import shutil
-
-def process_documents(files, user_id, store_name="default"):
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from rag.document_parser import parse_document
+from rag.embeddings import embed_query_cached, embed_queries_cached
+from rag.ingest_utils import report, cumulative_progress, split_into_chunks, persist_chunks
+from rag.lexical_index import CompositeLexicalIndex
+from rag.session_store import CompositeStore
+from rag.shared_sources import (
+    SHARE_SOURCES, fingerprint_bytes, is_source_stored, ingest_shared_source,
+    get_session_source_members, release_session_sources
+)
+from rag.store_manager import get_store_key, open_vector_store, delete_store_data, open_lexical_index
+from rag.web_crawler import forget_page_validators
+from utils.metrics import timed
+
+DOCUMENT_PARSE_WORKERS = int(os.environ.get("DOCUMENT_PARSE_WORKERS", str(os.cpu_count() or 1)))
+HYBRID_RETRIEVAL = os.environ.get("HYBRID_RETRIEVAL", "1") == "1"
+HYBRID_CANDIDATE_MULTIPLIER = 4
+RRF_K = 60
+
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+def get_parse_executor():
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            # spawn keeps the workers independent of the server's threads and loaded models
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=DOCUMENT_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_executor
+
+def parse_files_by_file(files, progress=None):
+    names = [file.name for file in files]
+    payloads = [file.getvalue() for file in files]
+
+    if len(files) > 1 and DOCUMENT_PARSE_WORKERS > 1:
+        results = get_parse_executor().map(parse_document, names, payloads)
+    else:
+        results = map(parse_document, names, payloads)
+
+    parsed = []
+    for files_parsed, file_docs in enumerate(results, start=1):
+        parsed.append(file_docs)
+        report(progress, "parse", files_parsed=files_parsed)
+    return parsed
+
+def parse_files(files, progress=None):
+    return [doc for file_docs in parse_files_by_file(files, progress) for doc in file_docs]
+
+def process_documents(files, user_id, store_name="default", progress=None):
     if not files:
         return None
-    
-    docs = []
-    temp_files = []
-    
+    if not SHARE_SOURCES:
+        return ingest_documents(files, user_id, store_name, progress)
+
+    try:
+        report(progress, "parse", files_total=len(files))
+        fingerprints = [fingerprint_bytes(file.getvalue()) for file in files]
+        # Files already stored by any session are linked without being parsed again.
+        new_files = [file for file, fingerprint in zip(files, fingerprints) if not is_source_stored(fingerprint)]
+        parsed = dict(zip((id(file) for file in new_files), parse_files_by_file(new_files, progress)))
+
+        vector_store = None
+        totals = {}
+        for file, fingerprint in zip(files, fingerprints):
+
+            def build(owner, source_store, file=file, fingerprint=fingerprint):
+                docs = parsed.get(id(file))
+                if docs is None:
+                    docs = parse_document(file.name, file.getvalue())
+                # The file name is per session; the shared chunks only carry the fingerprint.
+                for doc in docs:
+                    doc.metadata["source"] = fingerprint
+                chunks = split_into_chunks(docs, cumulative_progress(progress, totals)) if docs else []
+                if not chunks:
+                    return None
+                return persist_chunks(chunks, owner, source_store, cumulative_progress(progress, totals))
+
+            source_store = ingest_shared_source(
+                user_id, store_name, fingerprint, "documents", file.name, file.name, build, cumulative_progress(progress, totals)
+            )
+            vector_store = vector_store or source_store
+        return vector_store
+
+    except Exception as e:
+        print(f"Error processing documents: {str(e)}")
+        report(progress, "failed", error=str(e))
+        return None
+
+def ingest_documents(files, user_id, store_name="default", progress=None):
     try:
-        for file in files:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.name}") as tmp_file:
-                tmp_file.write(file.getvalue())
-                temp_file_path = tmp_file.name
-                temp_files.append(temp_file_path)
-            
-            if file.name.lower().endswith(".pdf"):
-                loader = PyPDFLoader(temp_file_path)
-            elif file.name.lower().endswith((".txt", ".md")):
-                loader = TextLoader(temp_file_path, encoding='utf-8')
-            else:
-                continue
-            
-            file_docs = loader.load()
-            
-            for doc in file_docs:
-                doc.metadata['source'] = file.name
-            
-            docs.extend(file_docs)
+        report(progress, "parse", files_total=len(files))
+        docs = parse_files(files, progress)
         
         if not docs:
             return None
         
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        
-        chunks = text_splitter.split_documents(docs)
+        chunks = split_into_chunks(docs, progress)
         
         if not chunks:
             return None
         
-        embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        
-        persist_directory = f"vector_store/{user_id}_{store_name}"
-        os.makedirs(persist_directory, exist_ok=True)
-        
-        vector_store = Chroma.from_documents(
-            chunks, 
-            embeddings,
-            persist_directory=persist_directory,
-            collection_name=f"{user_id}_{store_name}"
-        )
-        
-        return vector_store
+        return persist_chunks(chunks, user_id, store_name, progress)
         
     except Exception as e:
         print(f"Error processing documents: {str(e)}")
+        report(progress, "failed", error=str(e))
         return None
-    
-    finally:
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except OSError:
-                pass
 
 def load_vector_store(user_id, store_name="default"):
     try:
-        persist_directory = f"vector_store/{user_id}_{store_name}"
-        
-        if not os.path.exists(persist_directory):
-            return None
-            
-        embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
-        
-        vector_store = Chroma(
-            persist_directory=persist_directory,
-            embedding_function=embeddings,
-            collection_name=f"{user_id}_{store_name}"
-        )
-        
-        if vector_store._collection.count() == 0:
-            return None
-            
-        return vector_store
+        vector_store = open_vector_store(user_id, store_name)
+        members = get_session_source_members(user_id, store_name)
+        if not members:
+            return vector_store
+        if vector_store is not None:
+            members.insert(0, (user_id, store_name, vector_store))
+        return CompositeStore(members)
         
     except Exception as e:
         print(f"Error loading vector store: {str(e)}")
         return None
 
-def query_documents(vector_store, query, k=5):
+def load_lexical_index(user_id, store_name, vector_store):
+    if not HYBRID_RETRIEVAL or not vector_store:
+        return None
+    try:
+        if isinstance(vector_store, CompositeStore):
+            return CompositeLexicalIndex([
+                open_lexical_index(owner, member_name, member_store)
+                for owner, member_name, member_store in vector_store.members
+            ])
+        return open_lexical_index(user_id, store_name, vector_store)
+
+    except Exception as e:
+        print(f"Error loading lexical index: {str(e)}")
+        return None
+
+def reciprocal_rank_fusion(rankings, k):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+def _search(vector_store, query, query_vector, k, lexical_index):
+    if lexical_index is None or not len(lexical_index):
+        with timed("vector_search"):
+            return vector_store.similarity_search_by_vector(query_vector, k=k)
+
+    candidates = k * HYBRID_CANDIDATE_MULTIPLIER
+    with timed("vector_search"):
+        vector_docs = vector_store.similarity_search_by_vector(query_vector, k=candidates)
+    with timed("lexical_search"):
+        lexical_hits = lexical_index.search(query, k=candidates)
+
+    docs_by_id = {doc.id: doc for doc in vector_docs if doc.id}
+    fused_ids = reciprocal_rank_fusion(
+        [[doc.id for doc in vector_docs if doc.id], [chunk_id for chunk_id, _ in lexical_hits]], k
+    )
+    missing_ids = [chunk_id for chunk_id in fused_ids if chunk_id not in docs_by_id]
+    if missing_ids:
+        with timed("fetch_lexical_hits"):
+            docs_by_id.update({doc.id: doc for doc in vector_store.get_by_ids(missing_ids)})
+    return [docs_by_id[chunk_id] for chunk_id in fused_ids if chunk_id in docs_by_id]
+
+def query_documents(vector_store, query, k=5, lexical_index=None):
     try:
         if not vector_store:
             return []
         
-        docs = vector_store.similarity_search(query, k=k)
-        return docs
+        with timed("embed_query"):
+            query_vector = embed_query_cached(query)
+        return _search(vector_store, query, query_vector, k, lexical_index)
     
     except Exception as e:
         print(f"Error querying documents: {str(e)}")
         return []
 
+def query_documents_batch(vector_store, queries, k=5, lexical_index=None):
+    if not vector_store or not queries:
+        return [[] for _ in queries]
+    try:
+        with timed("embed_query"):
+            query_vectors = embed_queries_cached(queries)
+    except Exception as e:
+        print(f"Error embedding queries: {str(e)}")
+        return [[] for _ in queries]
+
+    results = []
+    for query, query_vector in zip(queries, query_vectors):
+        try:
+            results.append(_search(vector_store, query, query_vector, k, lexical_index))
+        except Exception as e:
+            print(f"Error querying documents: {str(e)}")
+            results.append([])
+    return results
+
 def delete_vector_store(user_id, store_name="default"):
     try:
-        persist_directory = f"vector_store/{user_id}_{store_name}"
-        
-        if os.path.exists(persist_directory):
-            shutil.rmtree(persist_directory)
-            return True
-        return False
+        released = release_session_sources(user_id, store_name)
+        forget_page_validators(get_store_key(user_id, store_name))
+        return delete_store_data(user_id, store_name) or released > 0
         
     except Exception as e:
         print(f"Error deleting vector store: {str(e)}")
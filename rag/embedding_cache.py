@@ -0,0 +1,150 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from rag.embeddings import get_embeddings, get_embedding_model_id
+
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_MAX_MB = int(os.environ.get("EMBEDDING_CACHE_MAX_MB", "1024"))
+# Trim down to this fraction of the budget so eviction does not run on every insert.
+EMBEDDING_CACHE_EVICT_TO = 0.9
+
+_conn = None
+_conn_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_total_bytes = None
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "embed_time_ms": 0.0, "time_saved_ms": 0.0}
+
+def _get_connection():
+    global _conn, _total_bytes
+    if _conn is None:
+        _conn = sqlite3.connect(EMBEDDING_CACHE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB,
+                size INTEGER,
+                last_used REAL
+            )
+        ''')
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        _conn.commit()
+        _total_bytes = _conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+    return _conn
+
+def get_chunk_key(text, model_id=None):
+    model_id = model_id or get_embedding_model_id()
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).hexdigest()
+
+def _encode(vector):
+    return array("f", vector).tobytes()
+
+def _decode(blob):
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+def _lookup(keys):
+    found = {}
+    with _conn_lock:
+        conn = _get_connection()
+        # Stay well below SQLite's bound parameter limit.
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch).fetchall()
+            for key, blob in rows:
+                found[key] = _decode(blob)
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+    return found
+
+def _store(entries):
+    global _total_bytes
+    evicted = 0
+    with _conn_lock:
+        conn = _get_connection()
+        now = time.time()
+        rows = [(key, _encode(vector), now) for key, vector in entries.items()]
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)",
+            [(key, blob, len(blob) + len(key), last_used) for key, blob, last_used in rows]
+        )
+        _total_bytes += sum(len(blob) + len(key) for key, blob, _ in rows)
+
+        max_bytes = EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+        if _total_bytes > max_bytes:
+            target = max_bytes * EMBEDDING_CACHE_EVICT_TO
+            cursor = conn.execute("SELECT key, size FROM embeddings ORDER BY last_used ASC")
+            stale = []
+            for key, size in cursor:
+                if _total_bytes <= target:
+                    break
+                stale.append((key,))
+                _total_bytes -= size
+            conn.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+            evicted = len(stale)
+        conn.commit()
+    with _stats_lock:
+        _cache_stats["evictions"] += evicted
+
+def embed_documents_cached(texts):
+    model_id = get_embedding_model_id()
+    keys = [get_chunk_key(text, model_id) for text in texts]
+    cached = _lookup(list(set(keys)))
+
+    # Repeated boilerplate within one batch is embedded only once.
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in missing:
+            missing[key] = text
+
+    embed_time_ms = 0.0
+    if missing:
+        start = time.perf_counter()
+        vectors = get_embeddings().embed_documents(list(missing.values()))
+        embed_time_ms = (time.perf_counter() - start) * 1000
+        fresh = dict(zip(missing.keys(), vectors))
+        _store(fresh)
+        cached.update(fresh)
+
+    hits = len(texts) - len(missing)
+    with _stats_lock:
+        per_chunk_ms = embed_time_ms / len(missing) if missing else _average_embed_ms()
+        time_saved_ms = hits * per_chunk_ms
+        _cache_stats["hits"] += hits
+        _cache_stats["misses"] += len(missing)
+        _cache_stats["embed_time_ms"] += embed_time_ms
+        _cache_stats["time_saved_ms"] += time_saved_ms
+
+    stats = {
+        "hits": hits,
+        "misses": len(missing),
+        "embed_time_ms": embed_time_ms,
+        "time_saved_ms": time_saved_ms,
+    }
+    return [cached[key] for key in keys], stats
+
+def _average_embed_ms():
+    if not _cache_stats["misses"]:
+        return 0.0
+    return _cache_stats["embed_time_ms"] / _cache_stats["misses"]
+
+def get_embedding_cache_stats():
+    lookups = _cache_stats["hits"] + _cache_stats["misses"]
+    return {
+        "hits": _cache_stats["hits"],
+        "misses": _cache_stats["misses"],
+        "evictions": _cache_stats["evictions"],
+        "hit_rate": round(_cache_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "approx_bytes": _total_bytes or 0,
+        "max_bytes": EMBEDDING_CACHE_MAX_MB * 1024 * 1024,
+        "embed_time_ms": round(_cache_stats["embed_time_ms"], 2),
+        "time_saved_ms": round(_cache_stats["time_saved_ms"], 2),
+    }
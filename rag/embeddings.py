@@ -0,0 +1,183 @@
+import os
+import logging
+import json
+import time
+import threading
+import resource
+from langchain_huggingface import HuggingFaceEmbeddings
+from utils.cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE", "cpu")
+# torch runs the model as is; onnx and int8 run it through ONNX Runtime (needs
+# optimum[onnxruntime]), int8 using the dynamically quantized export from the model repo.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BACKENDS = ("torch", "onnx", "int8")
+EMBEDDING_INT8_FILE = os.environ.get("EMBEDDING_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+# Largest cosine distance allowed between the vectors of this backend and the backend
+# the existing stores were built with.
+EMBEDDING_DIVERGENCE_TOLERANCE = float(os.environ.get("EMBEDDING_DIVERGENCE_TOLERANCE", "0.02"))
+EMBEDDING_REFERENCE_PATH = os.environ.get("EMBEDDING_REFERENCE_PATH", "vector_store/embedding_reference.json")
+REFERENCE_TEXTS = (
+    "How do I reset my password?",
+    "The quarterly report shows revenue grew by twelve percent.",
+    "Photosynthesis converts light energy into chemical energy in plants.",
+    "def add(a, b): return a + b",
+    "Le chat dort sur le canapé.",
+    "Shipping takes three to five business days within the country.",
+    "The defendant filed a motion to dismiss the case.",
+    "Mix the flour and butter, then bake for twenty minutes.",
+)
+QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "4096"))
+QUERY_CACHE_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+_query_cache = LRUCache(max_entries=QUERY_CACHE_MAX_ENTRIES, ttl_seconds=QUERY_CACHE_TTL_SECONDS)
+_embedding_stats = {
+    "model_name": EMBEDDING_MODEL_NAME,
+    "device": EMBEDDING_DEVICE,
+    "backend": EMBEDDING_BACKEND,
+    "backend_divergence": None,
+    "loaded": False,
+    "load_time_ms": None,
+    "warmup_time_ms": None,
+    "rss_delta_mb": None,
+    "peak_rss_mb": None,
+}
+
+def _peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def get_model_kwargs(backend):
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    model_kwargs = {'device': EMBEDDING_DEVICE}
+    if backend == "onnx":
+        model_kwargs['backend'] = "onnx"
+    elif backend == "int8":
+        model_kwargs['backend'] = "onnx"
+        model_kwargs['model_kwargs'] = {'file_name': EMBEDDING_INT8_FILE}
+    return model_kwargs
+
+def load_embeddings(backend):
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs=get_model_kwargs(backend),
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+def vector_divergence(reference_vectors, vectors):
+    # Vectors are normalized, so 1 - dot product is the cosine distance.
+    return max(
+        1.0 - sum(a * b for a, b in zip(reference, vector))
+        for reference, vector in zip(reference_vectors, vectors)
+    )
+
+def _load_reference():
+    if not os.path.exists(EMBEDDING_REFERENCE_PATH):
+        return {}
+    with open(EMBEDDING_REFERENCE_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_reference(reference):
+    os.makedirs(os.path.dirname(EMBEDDING_REFERENCE_PATH) or ".", exist_ok=True)
+    tmp_path = f"{EMBEDDING_REFERENCE_PATH}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(reference, f)
+    os.replace(tmp_path, EMBEDDING_REFERENCE_PATH)
+
+def check_backend_divergence(embeddings, backend):
+    # The first backend to run records reference vectors; stores are built with it. A
+    # different backend is only allowed if its vectors stay close enough to search those
+    # stores, otherwise queries and new chunks would silently land in a different space.
+    reference = _load_reference()
+    vectors = embeddings.embed_documents(list(REFERENCE_TEXTS))
+    entry = reference.get(EMBEDDING_MODEL_NAME)
+    if entry is None:
+        reference[EMBEDDING_MODEL_NAME] = {"backend": backend, "vectors": vectors}
+        _save_reference(reference)
+        return 0.0
+
+    divergence = vector_divergence(entry["vectors"], vectors)
+    if divergence > EMBEDDING_DIVERGENCE_TOLERANCE:
+        raise RuntimeError(
+            f"Embedding backend {backend} diverges from {entry['backend']}, which built the existing stores, "
+            f"by {divergence:.4f} (tolerance {EMBEDDING_DIVERGENCE_TOLERANCE}). Set EMBEDDING_BACKEND={entry['backend']} "
+            f"or re-ingest the stores and delete {EMBEDDING_REFERENCE_PATH}."
+        )
+    return divergence
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is not None:
+        return _embeddings
+
+    with _embeddings_lock:
+        if _embeddings is None:
+            rss_before = _peak_rss_mb()
+            start = time.perf_counter()
+            embeddings = load_embeddings(EMBEDDING_BACKEND)
+            load_time_ms = (time.perf_counter() - start) * 1000
+            rss_after = _peak_rss_mb()
+            divergence = check_backend_divergence(embeddings, EMBEDDING_BACKEND)
+
+            _embedding_stats.update({
+                "loaded": True,
+                "load_time_ms": round(load_time_ms, 2),
+                "rss_delta_mb": round(rss_after - rss_before, 2),
+                "peak_rss_mb": round(rss_after, 2),
+                "backend_divergence": round(divergence, 6),
+            })
+            logger.info("Loaded embedding model %s (%s) in %.0f ms (+%.0f MB RSS)",
+                        EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, load_time_ms, rss_after - rss_before)
+            _embeddings = embeddings
+
+    return _embeddings
+
+def warm_up_embeddings():
+    embeddings = get_embeddings()
+    # The first forward pass allocates the inference buffers, so run one here
+    # instead of on the first user query.
+    start = time.perf_counter()
+    embeddings.embed_query("warm up")
+    _embedding_stats["warmup_time_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    _embedding_stats["peak_rss_mb"] = round(_peak_rss_mb(), 2)
+    return embeddings
+
+def get_embedding_stats():
+    return dict(_embedding_stats)
+
+def get_embedding_model_id():
+    # Backends produce slightly different vectors, so cached vectors are kept per backend.
+    return f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_BACKEND}"
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def embed_query_cached(query):
+    normalized = normalize_query(query)
+    key = (get_embedding_model_id(), normalized)
+    vector = _query_cache.get(key)
+    if vector is None:
+        vector = get_embeddings().embed_query(normalized)
+        _query_cache.put(key, vector)
+    return vector
+
+def embed_queries_cached(queries):
+    # Embeds every query the cache has not seen in one model call.
+    normalized = [normalize_query(query) for query in queries]
+    model_id = get_embedding_model_id()
+    vectors = {text: _query_cache.get((model_id, text)) for text in set(normalized)}
+    missing = [text for text, vector in vectors.items() if vector is None]
+    if missing:
+        for text, vector in zip(missing, get_embeddings().embed_documents(missing)):
+            vectors[text] = vector
+            _query_cache.put((model_id, text), vector)
+    return [vectors[text] for text in normalized]
+
+def get_query_cache_stats():
+    return _query_cache.stats()
@@ -0,0 +1,135 @@
+import os
+import json
+import uuid
+import threading
+import numpy as np
+from langchain_core.documents import Document
+
+EXACT_SEARCH_DTYPE = os.environ.get("EXACT_SEARCH_DTYPE", "float32")
+METADATA_FILE_NAME = "metadata.json"
+VECTORS_FILE_PREFIX = "vectors-"
+
+def snapshot_exists(path):
+    return os.path.exists(os.path.join(path, METADATA_FILE_NAME))
+
+def write_snapshot(path, ids, embeddings, documents, metadatas, dtype=EXACT_SEARCH_DTYPE):
+    # Each write gets a new vectors file and the metadata file, which names it, is
+    # swapped in last, so readers never pair new ids with old vectors.
+    os.makedirs(path, exist_ok=True)
+    vectors_file = f"{VECTORS_FILE_PREFIX}{uuid.uuid4().hex}.npy"
+    vectors = np.asarray(embeddings, dtype=dtype).reshape(len(ids), -1)
+    np.save(os.path.join(path, vectors_file), vectors)
+
+    metadata = {"vectors_file": vectors_file, "ids": list(ids), "documents": list(documents), "metadatas": list(metadatas)}
+    tmp_path = os.path.join(path, f"{METADATA_FILE_NAME}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    os.replace(tmp_path, os.path.join(path, METADATA_FILE_NAME))
+
+    # Processes that still map an old file keep its pages until they reload.
+    for name in os.listdir(path):
+        if name.startswith(VECTORS_FILE_PREFIX) and name != vectors_file:
+            os.remove(os.path.join(path, name))
+
+def _matches(metadata, where):
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    for key, value in where.items():
+        if isinstance(value, dict):
+            value = value.get("$eq")
+        if metadata.get(key) != value:
+            return False
+    return True
+
+class ExactStore:
+    # Read-only exact search over a snapshot of a small store: one matmul over the
+    # normalized vectors instead of opening Chroma and its HNSW index. The vectors
+    # are memory-mapped, so every process serving the store shares the same pages
+    # through the OS cache. Writes still go to Chroma, which refreshes the snapshot.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._snapshot = None
+        self._load()
+
+    def _load(self):
+        metadata_path = os.path.join(self.path, METADATA_FILE_NAME)
+        for attempt in range(2):
+            mtime = os.stat(metadata_path).st_mtime_ns
+            with open(metadata_path, encoding="utf-8") as f:
+                metadata = json.load(f)
+            try:
+                vectors = np.load(os.path.join(self.path, metadata["vectors_file"]), mmap_mode="r")
+                break
+            except FileNotFoundError:
+                # A writer replaced the snapshot between reading the metadata and the vectors.
+                if attempt:
+                    raise
+        ids = metadata["ids"]
+        positions = {chunk_id: position for position, chunk_id in enumerate(ids)}
+        self._snapshot = (vectors, ids, metadata["documents"], metadata["metadatas"], positions)
+        self._mtime = mtime
+
+    def _current(self):
+        # Another process may have rewritten the snapshot since it was loaded.
+        try:
+            mtime = os.stat(os.path.join(self.path, METADATA_FILE_NAME)).st_mtime_ns
+        except FileNotFoundError:
+            return self._snapshot
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._load()
+        return self._snapshot
+
+    def _document(self, snapshot, position):
+        _, ids, documents, metadatas, _ = snapshot
+        return Document(id=ids[position], page_content=documents[position], metadata=metadatas[position] or {})
+
+    def count(self):
+        return len(self._current()[1])
+
+    def exists(self):
+        return self.count() > 0
+
+    def get(self, ids=None, where=None, include=()):
+        snapshot = self._current()
+        vectors, all_ids, documents, metadatas, positions = snapshot
+        if ids is None:
+            selected = range(len(all_ids))
+        else:
+            selected = [positions[chunk_id] for chunk_id in ids if chunk_id in positions]
+        if where:
+            selected = [position for position in selected if _matches(metadatas[position] or {}, where)]
+
+        data = {"ids": [all_ids[position] for position in selected]}
+        if "documents" in include:
+            data["documents"] = [documents[position] for position in selected]
+        if "metadatas" in include:
+            data["metadatas"] = [metadatas[position] for position in selected]
+        if "embeddings" in include:
+            data["embeddings"] = np.asarray(vectors[list(selected)], dtype=np.float32)
+        return data
+
+    def similarity_search_by_vector_with_distance(self, embedding, k=4):
+        snapshot = self._current()
+        vectors = snapshot[0]
+        if not len(vectors):
+            return []
+        # float16 snapshots are promoted to float32 for the product, keeping BLAS and precision.
+        scores = vectors @ np.asarray(embedding, dtype=np.float32)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        # Vectors are normalized, so this is the squared L2 distance Chroma reports and
+        # distances from both kinds of store compare directly.
+        return [(self._document(snapshot, position), max(0.0, float(2.0 - 2.0 * scores[position]))) for position in top]
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_distance(embedding, k=k)]
+
+    def get_by_ids(self, ids):
+        snapshot = self._current()
+        positions = snapshot[4]
+        return [self._document(snapshot, positions[chunk_id]) for chunk_id in ids if chunk_id in positions]
@@ -0,0 +1,171 @@
+import os
+import logging
+import time
+import hashlib
+from collections import Counter
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from rag.embedding_cache import embed_documents_cached
+from rag.lexical_index import load_index, save_index, update_index
+from rag.store_manager import get_store_key, store_exists, store_lock, get_or_create_vector_store, open_vector_store, cache_vector_store, mark_store_changed, get_lexical_index_path, build_lexical_index
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+CUMULATIVE_FIELDS = ("documents", "chunks_total", "chunks_embedded", "chunks_new", "chunks_unchanged", "chunks_removed", "sources_linked")
+
+class InMemoryUpload:
+    # Mirrors the parts of Streamlit's UploadedFile that process_documents uses.
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def getvalue(self):
+        return self.data
+
+def report(progress, stage, **fields):
+    if progress:
+        progress(stage, **fields)
+
+def cumulative_progress(progress, totals):
+    # persist_chunks reports counts for one batch; add them to what earlier batches reported.
+    base = dict(totals)
+
+    def batch_progress(stage, **fields):
+        for field in CUMULATIVE_FIELDS:
+            if field in fields:
+                fields[field] = base.get(field, 0) + fields[field]
+                totals[field] = fields[field]
+        report(progress, stage, **fields)
+
+    return batch_progress
+
+def split_into_chunks(docs, progress=None):
+    report(progress, "split", documents=len(docs))
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        add_start_index=True
+    )
+    chunks = text_splitter.split_documents(docs)
+    report(progress, "split", chunks_total=len(chunks))
+    return chunks
+
+def get_chunk_id(chunk):
+    source = str(chunk.metadata.get("source", ""))
+    source_hash = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()[:32]
+    return f"{source_hash}-{content_hash}"
+
+def embed_chunks(texts, store_key, progress=None):
+    report(progress, "embed", chunks_embedded=0)
+    start = time.perf_counter()
+    vectors = []
+    cache_hits = 0
+    time_saved_ms = 0.0
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch_vectors, cache_stats = embed_documents_cached(texts[i:i + EMBED_BATCH_SIZE])
+        vectors.extend(batch_vectors)
+        cache_hits += cache_stats["hits"]
+        time_saved_ms += cache_stats["time_saved_ms"]
+        elapsed = time.perf_counter() - start
+        report(progress, "embed", chunks_embedded=len(vectors),
+               embed_chunks_per_second=round(len(vectors) / elapsed, 2) if elapsed else None,
+               embedding_cache_hits=cache_hits,
+               embedding_cache_hit_rate=round(cache_hits / len(vectors), 4),
+               embedding_time_saved_ms=round(time_saved_ms, 2))
+    if texts:
+        logger.info("Embedded %d chunks for %s: %d cache hits (%.0f%%), ~%.0f ms saved",
+                    len(texts), store_key, cache_hits, 100 * cache_hits / len(texts), time_saved_ms)
+    return vectors
+
+def get_source_chunk_ids(vector_store, source):
+    return vector_store.get(where={"source": source})["ids"]
+
+def _delete_ids(vector_store, ids):
+    texts = []
+    max_batch_size = vector_store.max_batch_size
+    for i in range(0, len(ids), max_batch_size):
+        batch = ids[i:i + max_batch_size]
+        texts.extend(vector_store.get(ids=batch, include=["documents"])["documents"])
+        vector_store.delete(batch)
+    return texts
+
+def update_lexical_index(user_id, store_name, vector_store, added_ids=(), added_texts=(), removed_ids=(), removed_texts=()):
+    # Callers hold store_lock. The cached index is patched in place and the change is
+    # appended to its journal, so neither the index file nor the whole index is rewritten.
+    path = get_lexical_index_path(user_id, store_name)
+    index = load_index(path)
+    if index is not None:
+        update_index(index, path, added_ids, added_texts, removed_ids, removed_texts)
+        if len(index) == vector_store.count():
+            return
+        # Another process wrote to the store without updating the index.
+    save_index(build_lexical_index(vector_store), path)
+
+def persist_chunks(chunks, user_id, store_name="default", progress=None, refresh_snapshot=True):
+    # Chunks are keyed by source plus content hash, so re-ingesting a source only
+    # embeds chunks that are new and drops the ones that no longer exist.
+    unique_chunks = {}
+    for chunk in chunks:
+        unique_chunks.setdefault(get_chunk_id(chunk), chunk)
+
+    existing_ids = set()
+    if store_exists(user_id, store_name):
+        vector_store = get_or_create_vector_store(user_id, store_name)
+        for source in {str(chunk.metadata.get("source", "")) for chunk in chunks}:
+            existing_ids.update(get_source_chunk_ids(vector_store, source))
+
+    new_ids = [chunk_id for chunk_id in unique_chunks if chunk_id not in existing_ids]
+    stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in unique_chunks]
+    report(progress, "embed", chunks_total=len(chunks), chunks_new=len(new_ids),
+           chunks_unchanged=len(unique_chunks) - len(new_ids))
+
+    texts = [unique_chunks[chunk_id].page_content for chunk_id in new_ids]
+    metadatas = [unique_chunks[chunk_id].metadata for chunk_id in new_ids]
+    vectors = embed_chunks(texts, get_store_key(user_id, store_name), progress)
+
+    report(progress, "persist")
+    # Jobs that persist in batches pass refresh_snapshot=False and call
+    # cache_vector_store once at the end, instead of rewriting the snapshot per batch.
+    with store_lock(user_id, store_name):
+        vector_store = get_or_create_vector_store(user_id, store_name)
+        max_batch_size = vector_store.max_batch_size
+        for i in range(0, len(new_ids), max_batch_size):
+            vector_store.upsert(
+                ids=new_ids[i:i + max_batch_size],
+                embeddings=vectors[i:i + max_batch_size],
+                documents=texts[i:i + max_batch_size],
+                metadatas=metadatas[i:i + max_batch_size]
+            )
+        stale_texts = _delete_ids(vector_store, stale_ids)
+        update_lexical_index(user_id, store_name, vector_store, new_ids, texts, stale_ids, stale_texts)
+        if refresh_snapshot:
+            cache_vector_store(user_id, store_name, vector_store)
+        else:
+            mark_store_changed(user_id, store_name)
+    report(progress, "persist", chunks_removed=len(stale_ids))
+
+    return vector_store
+
+def remove_source(user_id, store_name, source, refresh_snapshot=True):
+    if not store_exists(user_id, store_name):
+        return 0
+    with store_lock(user_id, store_name):
+        vector_store = get_or_create_vector_store(user_id, store_name)
+        ids = get_source_chunk_ids(vector_store, source)
+        texts = _delete_ids(vector_store, ids)
+        update_lexical_index(user_id, store_name, vector_store, removed_ids=ids, removed_texts=texts)
+        if refresh_snapshot:
+            cache_vector_store(user_id, store_name, vector_store)
+        else:
+            mark_store_changed(user_id, store_name)
+    return len(ids)
+
+def list_sources(user_id, store_name):
+    vector_store = open_vector_store(user_id, store_name)
+    if vector_store is None:
+        return []
+    metadatas = vector_store.get(include=["metadatas"])["metadatas"]
+    counts = Counter(str((metadata or {}).get("source", "")) for metadata in metadatas)
+    return [{"source": source, "chunks": count} for source, count in counts.items()]
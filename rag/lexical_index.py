@@ -0,0 +1,222 @@
+import os
+import re
+import json
+import math
+import uuid
+import heapq
+import threading
+from collections import Counter
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Only the highest-scoring postings of each term are scanned at query time.
+# Lexical hits are fusion candidates, so very common terms do not need their full list.
+MAX_IMPACTS_PER_TERM = 256
+INDEX_FILE_NAME = "lexical_index.json"
+# Changes since the index file was written are appended to a journal next to it, which
+# is folded back into the file once it grows past this fraction of the file's size.
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_RATIO = 0.5
+
+# Keeps identifiers such as error codes, dotted versions and snake_case names whole.
+TOKEN_PATTERN = re.compile(r"\w(?:[\w.\-]*\w)?")
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def get_journal_path(path):
+    return f"{path}{JOURNAL_SUFFIX}"
+
+class LexicalIndex:
+    # Changes are applied in place under the index's lock; searches running meanwhile
+    # keep the impact lists they already fetched.
+    def __init__(self, doc_lengths=None, postings=None):
+        self.doc_lengths = doc_lengths or {}
+        self.postings = postings or {}
+        self._total_length = sum(self.doc_lengths.values())
+        self._impacts = {}
+        self._lock = threading.RLock()
+        self._journal_offset = 0
+
+    def add(self, ids, texts):
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                if chunk_id in self.doc_lengths:
+                    continue
+                terms = tokenize(text)
+                self.doc_lengths[chunk_id] = len(terms)
+                self._total_length += len(terms)
+                for term, tf in Counter(terms).items():
+                    self.postings.setdefault(term, {})[chunk_id] = tf
+            self._impacts = {}
+
+    def remove(self, ids, texts):
+        with self._lock:
+            for chunk_id, text in zip(ids, texts):
+                length = self.doc_lengths.pop(chunk_id, None)
+                if length is None:
+                    continue
+                self._total_length -= length
+                for term in set(tokenize(text)):
+                    docs = self.postings.get(term)
+                    if docs is not None:
+                        docs.pop(chunk_id, None)
+                        if not docs:
+                            del self.postings[term]
+            self._impacts = {}
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def _term_impacts(self, term):
+        # BM25 term weights only change when the corpus does, so each term's postings
+        # are scored on first use after a change and a query is then just a sum.
+        impacts = self._impacts.get(term)
+        if impacts is not None:
+            return impacts
+        with self._lock:
+            impacts = self._impacts.get(term)
+            if impacts is not None:
+                return impacts
+            docs = self.postings.get(term)
+            if not docs:
+                return ()
+            doc_count = len(self.doc_lengths)
+            avg_length = self._total_length / doc_count
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            impacts = []
+            for chunk_id, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[chunk_id] / avg_length) if avg_length else BM25_K1
+                impacts.append((chunk_id, idf * tf * (BM25_K1 + 1) / (tf + norm)))
+            if len(impacts) > MAX_IMPACTS_PER_TERM:
+                impacts = heapq.nlargest(MAX_IMPACTS_PER_TERM, impacts, key=lambda item: item[1])
+            self._impacts[term] = impacts
+            return impacts
+
+    def search(self, query, k=10):
+        scores = {}
+        get_score = scores.get
+        for term in set(tokenize(query)):
+            for chunk_id, impact in self._term_impacts(term):
+                scores[chunk_id] = get_score(chunk_id, 0.0) + impact
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def _apply(self, entry):
+        self.remove(*entry["remove"])
+        self.add(*entry["add"])
+
+    def replay(self, path):
+        # Applies journal entries this index has not seen, e.g. ones another process wrote.
+        journal_path = get_journal_path(path)
+        with self._lock:
+            try:
+                if os.path.getsize(journal_path) <= self._journal_offset:
+                    return
+                with open(journal_path, "rb") as f:
+                    f.seek(self._journal_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            # A line another process is still writing is picked up next time.
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                self._apply(json.loads(line))
+            self._journal_offset += end
+
+    def update(self, path, added_ids=(), added_texts=(), removed_ids=(), removed_texts=()):
+        # Applies a change and appends it to the journal, so its cost is the size of the
+        # change; the index file is only rewritten when the journal is compacted.
+        with self._lock:
+            self.replay(path)
+            entry = {"add": [list(added_ids), list(added_texts)], "remove": [list(removed_ids), list(removed_texts)]}
+            self._apply(entry)
+            with open(get_journal_path(path), "ab") as f:
+                f.write(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+                self._journal_offset = f.tell()
+            if self._journal_offset > JOURNAL_COMPACT_RATIO * os.path.getsize(path):
+                self.save(path)
+
+    def save(self, path):
+        with self._lock:
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "doc_lengths": self.doc_lengths, "postings": self.postings},
+                          f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+            # The file now holds everything the journal did.
+            _remove_file(get_journal_path(path))
+            self._journal_offset = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["doc_lengths"], data["postings"])
+        index.replay(path)
+        return index
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class CompositeLexicalIndex:
+    # Searches several indexes and keeps the best hits overall. Each index has its own
+    # IDF statistics, which is close enough for picking fusion candidates.
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes)
+
+    def search(self, query, k=10):
+        scores = {}
+        for index in self.indexes:
+            for chunk_id, score in index.search(query, k=k):
+                if score > scores.get(chunk_id, 0.0):
+                    scores[chunk_id] = score
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def get_index_path(persist_directory):
+    return os.path.join(persist_directory, INDEX_FILE_NAME)
+
+def load_index(path):
+    # The index file is only replaced when the journal is compacted, so its mtime tells
+    # us whether to reload; otherwise the cached index catches up with the journal.
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(path)
+    if cached is not None and cached[0] == mtime:
+        cached[1].replay(path)
+        return cached[1]
+    index = LexicalIndex.load(path)
+    with _loaded_lock:
+        _loaded[path] = (mtime, index)
+    return index
+
+def save_index(index, path):
+    index.save(path)
+    with _loaded_lock:
+        _loaded[path] = (os.stat(path).st_mtime_ns, index)
+
+def update_index(index, path, added_ids=(), added_texts=(), removed_ids=(), removed_texts=()):
+    index.update(path, added_ids, added_texts, removed_ids, removed_texts)
+    # A compaction replaced the file.
+    with _loaded_lock:
+        _loaded[path] = (os.stat(path).st_mtime_ns, index)
+
+def drop_index(path):
+    with _loaded_lock:
+        _loaded.pop(path, None)
+
+def delete_index(path):
+    drop_index(path)
+    _remove_file(path)
+    _remove_file(get_journal_path(path))
@@ -0,0 +1,144 @@
+class SessionStore:
+    # One session's view of a Chroma collection. In the shared layout many sessions
+    # live in the same collection, so every read is filtered by the session's metadata
+    # and chunk ids are prefixed to stay unique; callers only ever see their own ids.
+    def __init__(self, vector_store, scope=None):
+        self.vector_store = vector_store
+        self.scope = scope
+        self._prefix = f"{scope['user_id']}:{scope['session_id']}:" if scope else ""
+
+    @property
+    def max_batch_size(self):
+        return self.vector_store._client.get_max_batch_size()
+
+    def _where(self, where=None):
+        clauses = [{key: value} for key, value in (self.scope or {}).items()]
+        if where:
+            clauses.append(where)
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def _store_ids(self, ids):
+        return [self._prefix + chunk_id for chunk_id in ids]
+
+    def _chunk_id(self, store_id):
+        return store_id[len(self._prefix):] if store_id else store_id
+
+    def _strip_doc_ids(self, docs):
+        if self._prefix:
+            for doc in docs:
+                doc.id = self._chunk_id(doc.id)
+        return docs
+
+    def count(self):
+        if not self.scope:
+            return self.vector_store._collection.count()
+        return len(self.vector_store._collection.get(where=self._where(), include=[])["ids"])
+
+    def exists(self):
+        if not self.scope:
+            return self.vector_store._collection.count() > 0
+        return bool(self.vector_store._collection.get(where=self._where(), limit=1, include=[])["ids"])
+
+    def get(self, ids=None, where=None, include=()):
+        data = self.vector_store._collection.get(
+            ids=self._store_ids(ids) if ids is not None else None,
+            where=self._where(where),
+            include=list(include)
+        )
+        data["ids"] = [self._chunk_id(store_id) for store_id in data["ids"]]
+        return data
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        if self.scope:
+            metadatas = [{**(metadata or {}), **self.scope} for metadata in metadatas]
+        self.vector_store._collection.upsert(
+            ids=self._store_ids(ids),
+            embeddings=embeddings,
+            documents=documents,
+            metadatas=metadatas
+        )
+
+    def delete(self, ids):
+        if ids:
+            self.vector_store._collection.delete(ids=self._store_ids(ids))
+
+    def delete_all(self):
+        self.vector_store._collection.delete(where=self._where())
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        docs = self.vector_store.similarity_search_by_vector(embedding, k=k, filter=self._where())
+        return self._strip_doc_ids(docs)
+
+    def similarity_search_by_vector_with_distance(self, embedding, k=4):
+        # langchain-chroma names this "relevance scores" but returns raw distances.
+        results = self.vector_store.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=self._where()
+        )
+        self._strip_doc_ids([doc for doc, _ in results])
+        return results
+
+    def get_by_ids(self, ids):
+        return self._strip_doc_ids(self.vector_store.get_by_ids(self._store_ids(ids)))
+
+class RenamedSourceStore:
+    # A shared document store as one session sees it. Its chunks are labelled with the
+    # file's fingerprint rather than the first uploader's file name; each session sees
+    # the name it linked the file under.
+    def __init__(self, vector_store, name):
+        self.vector_store = vector_store
+        self.name = name
+
+    def _rename(self, docs):
+        for doc in docs:
+            doc.metadata = {**doc.metadata, "source": self.name}
+        return docs
+
+    def count(self):
+        return self.vector_store.count()
+
+    def get(self, ids=None, where=None, include=()):
+        return self.vector_store.get(ids=ids, where=where, include=include)
+
+    def similarity_search_by_vector_with_distance(self, embedding, k=4):
+        results = self.vector_store.similarity_search_by_vector_with_distance(embedding, k=k)
+        self._rename([doc for doc, _ in results])
+        return results
+
+    def get_by_ids(self, ids):
+        return self._rename(self.vector_store.get_by_ids(ids))
+
+class CompositeStore:
+    # A session's searchable view over its own store plus the shared source stores it
+    # links to. members are (owner, store_name, store) so callers can find each
+    # member's lexical index.
+    def __init__(self, members):
+        self.members = members
+
+    def count(self):
+        return sum(store.count() for _, _, store in self.members)
+
+    def similarity_search_by_vector(self, embedding, k=4):
+        # Every member uses the same embedding model and distance, so distances compare directly.
+        results = []
+        for _, _, store in self.members:
+            results.extend(store.similarity_search_by_vector_with_distance(embedding, k=k))
+        results.sort(key=lambda item: item[1])
+        docs = []
+        seen = set()
+        for doc, _ in results:
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
+            docs.append(doc)
+            if len(docs) == k:
+                break
+        return docs
+
+    def get_by_ids(self, ids):
+        docs = {}
+        for _, _, store in self.members:
+            for doc in store.get_by_ids(ids):
+                docs.setdefault(doc.id, doc)
+        return [docs[chunk_id] for chunk_id in ids if chunk_id in docs]
@@ -0,0 +1,125 @@
+import os
+import logging
+import time
+import hashlib
+import threading
+from datetime import datetime
+from rag.ingest_utils import report, list_sources, remove_source
+from rag.session_store import RenamedSourceStore
+from rag.store_manager import get_store_key, store_exists, open_vector_store, delete_store_data
+from rag.web_crawler import forget_page_validators
+from utils.db_utils import get_source_record, link_recorded_source, record_linked_source, get_session_sources, unlink_session_source
+
+logger = logging.getLogger(__name__)
+
+# Sources are stored once per fingerprint, in a store owned by SOURCE_STORE_OWNER and
+# named by the fingerprint, and sessions link to them. Stores ingested before this
+# stay per session and are still searched alongside the linked ones.
+SHARE_SOURCES = os.environ.get("SHARE_SOURCES", "1") == "1"
+# Chroma collection names must start and end with a letter or digit. Like a user id,
+# the owner has no underscore, so its store directories parse like any other.
+SOURCE_STORE_OWNER = "sources"
+# Website sources change, so a link older than this re-crawls (cheaply, with conditional GETs).
+SOURCE_REFRESH_SECONDS = int(os.environ.get("SOURCE_REFRESH_SECONDS", "86400"))
+
+# The thread locks keep one process from building a source twice at once; the
+# link/unlink protocol itself is made safe across processes by transactions in users.db.
+_source_locks = {}
+_source_locks_guard = threading.Lock()
+
+def _source_lock(fingerprint):
+    with _source_locks_guard:
+        return _source_locks.setdefault(fingerprint, threading.Lock())
+
+def fingerprint_bytes(data):
+    return f"doc-{hashlib.sha256(data).hexdigest()}"
+
+def fingerprint_origin(kind, origin):
+    return f"{kind}-{hashlib.sha256(origin.encode('utf-8')).hexdigest()}"
+
+def _is_stale(record):
+    refreshed_at = datetime.fromisoformat(record["refreshed_at"])
+    return (datetime.now() - refreshed_at).total_seconds() > SOURCE_REFRESH_SECONDS
+
+def is_source_stored(fingerprint):
+    return get_source_record(fingerprint) is not None and store_exists(SOURCE_STORE_OWNER, fingerprint)
+
+def ingest_shared_source(user_id, session_id, fingerprint, kind, name, origin, build, progress=None, refreshable=False):
+    # build(store_owner, store_name) ingests the source into that store and returns it, or None.
+    vector_store = _link_or_build_source(user_id, session_id, fingerprint, kind, name, origin, build, progress, refreshable)
+    if vector_store is not None:
+        # Outside the fingerprint lock: releasing takes the lock of the replaced source.
+        _release_replaced_sources(user_id, session_id, fingerprint, name)
+    return vector_store
+
+def _link_or_build_source(user_id, session_id, fingerprint, kind, name, origin, build, progress, refreshable):
+    with _source_lock(fingerprint):
+        # A stale source is linked before it is refreshed, so the link keeps a session
+        # releasing it elsewhere from deleting the store during the refresh.
+        record = link_recorded_source(user_id, session_id, fingerprint, name,
+                                      lambda record: store_exists(SOURCE_STORE_OWNER, fingerprint))
+        if record and not (refreshable and _is_stale(record)):
+            logger.info("Linked shared source %s (%s chunks) to %s", name, record["chunk_count"], session_id)
+            report(progress, "linked", sources_linked=1)
+            return open_vector_store(SOURCE_STORE_OWNER, fingerprint)
+
+        start = time.perf_counter()
+        vector_store = build(SOURCE_STORE_OWNER, fingerprint)
+        if vector_store is None:
+            # A failed refresh leaves the previous index in place.
+            return open_vector_store(SOURCE_STORE_OWNER, fingerprint) if record else None
+        record_linked_source(user_id, session_id, fingerprint, name, kind, origin, vector_store.count())
+        logger.info("Ingested shared source %s in %.1f s", name, time.perf_counter() - start)
+        return vector_store
+
+def release_source(user_id, session_id, fingerprint):
+    def delete_source():
+        forget_page_validators(get_store_key(SOURCE_STORE_OWNER, fingerprint))
+        delete_store_data(SOURCE_STORE_OWNER, fingerprint)
+
+    with _source_lock(fingerprint):
+        return unlink_session_source(user_id, session_id, fingerprint, on_release=delete_source)
+
+def _release_replaced_sources(user_id, session_id, fingerprint, name):
+    # A session keeps one version of each source name, as persist_chunks does within a
+    # store: linking a changed file under a name already in use drops the old version,
+    # including chunks ingested into the session's own store before sources were shared.
+    for linked in get_session_sources(user_id, session_id):
+        if linked["name"] == name and linked["fingerprint"] != fingerprint:
+            release_source(user_id, session_id, linked["fingerprint"])
+    remove_source(user_id, session_id, name)
+
+def release_session_sources(user_id, session_id):
+    freed = 0
+    for source in get_session_sources(user_id, session_id):
+        freed += release_source(user_id, session_id, source["fingerprint"])
+    return freed
+
+def get_session_source_members(user_id, session_id):
+    members = []
+    for source in get_session_sources(user_id, session_id):
+        vector_store = open_vector_store(SOURCE_STORE_OWNER, source["fingerprint"])
+        if vector_store is not None:
+            if source["kind"] == "documents":
+                vector_store = RenamedSourceStore(vector_store, source["name"])
+            members.append((SOURCE_STORE_OWNER, source["fingerprint"], vector_store))
+    return members
+
+def session_has_sources(user_id, session_id):
+    return store_exists(user_id, session_id) or bool(get_session_sources(user_id, session_id))
+
+def list_session_sources(user_id, session_id):
+    sources = list_sources(user_id, session_id)
+    sources.extend(
+        {"source": source["name"], "chunks": source["chunk_count"] or 0}
+        for source in get_session_sources(user_id, session_id)
+    )
+    return sources
+
+def remove_session_source(user_id, session_id, source):
+    chunks_removed = 0
+    for linked in get_session_sources(user_id, session_id):
+        if linked["name"] == source:
+            release_source(user_id, session_id, linked["fingerprint"])
+            chunks_removed += linked["chunk_count"] or 0
+    return chunks_removed + remove_source(user_id, session_id, source)
@@ -0,0 +1,32 @@
+import os
+import json
+import uuid
+import numpy as np
+
+STORE_ARCHIVE_DTYPE = os.environ.get("STORE_ARCHIVE_DTYPE", "float32")
+ARCHIVE_FORMAT_VERSION = 1
+
+def write_archive(path, ids, embeddings, documents, metadatas, dtype=STORE_ARCHIVE_DTYPE):
+    # A compressed .npz with the vectors and a JSON record of ids, text and metadata.
+    # It only depends on numpy, so an archive can be restored into any store layout.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = json.dumps({
+        "version": ARCHIVE_FORMAT_VERSION,
+        "ids": list(ids),
+        "documents": list(documents),
+        "metadatas": list(metadatas),
+    }).encode("utf-8")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            vectors=np.asarray(embeddings, dtype=dtype).reshape(len(ids), -1),
+            records=np.frombuffer(records, dtype=np.uint8)
+        )
+    os.replace(tmp_path, path)
+
+def read_archive(path):
+    with np.load(path) as archive:
+        vectors = archive["vectors"].astype(np.float32)
+        records = json.loads(archive["records"].tobytes().decode("utf-8"))
+    return records["ids"], vectors, records["documents"], records["metadatas"]
@@ -0,0 +1,72 @@
+import os
+import logging
+import time
+import threading
+from rag.shared_sources import SOURCE_STORE_OWNER
+from rag.store_manager import is_shared_mode, iter_store_directories, pop_store_accesses, archive_vector_store, empty_store_trash
+from utils.db_utils import record_store_activity, record_untracked_session_stores, get_inactive_stores, forget_store_activity
+
+logger = logging.getLogger(__name__)
+
+# Stores nobody has opened for this long are archived; 0 disables archival.
+STORE_ARCHIVE_AFTER_DAYS = float(os.environ.get("STORE_ARCHIVE_AFTER_DAYS", "30"))
+STORE_LIFECYCLE_INTERVAL_SECONDS = int(os.environ.get("STORE_LIFECYCLE_INTERVAL_SECONDS", "600"))
+
+_lifecycle_thread = None
+_lifecycle_lock = threading.Lock()
+_lifecycle_stop = threading.Event()
+
+def run_lifecycle_pass():
+    now = time.time()
+    record_store_activity(pop_store_accesses())
+    # Stores from before activity was tracked count as used now.
+    if is_shared_mode():
+        record_untracked_session_stores(now, SOURCE_STORE_OWNER)
+    else:
+        record_store_activity([(user_id, store_name, now) for _, user_id, store_name in iter_store_directories()],
+                              keep_existing=True)
+
+    archived = 0
+    if STORE_ARCHIVE_AFTER_DAYS > 0:
+        for user_id, store_name in get_inactive_stores(now - STORE_ARCHIVE_AFTER_DAYS * 86400):
+            try:
+                archived += archive_vector_store(user_id, store_name)
+            except Exception as e:
+                print(f"Error archiving store {user_id}/{store_name}: {str(e)}")
+                continue
+            # The next access records the store again, whether it was archived or is gone.
+            forget_store_activity(user_id, store_name)
+
+    trash_removed = empty_store_trash()
+    if archived or trash_removed:
+        logger.info("Store lifecycle: archived %d inactive stores, removed %d deleted stores", archived, trash_removed)
+    return {"archived": archived, "trash_removed": trash_removed}
+
+def _run_lifecycle():
+    while not _lifecycle_stop.wait(STORE_LIFECYCLE_INTERVAL_SECONDS):
+        try:
+            run_lifecycle_pass()
+        except Exception as e:
+            print(f"Error in store lifecycle pass: {str(e)}")
+
+def start_store_lifecycle():
+    global _lifecycle_thread
+    with _lifecycle_lock:
+        if _lifecycle_thread is not None:
+            return
+        _lifecycle_stop.clear()
+        _lifecycle_thread = threading.Thread(target=_run_lifecycle, name="store-lifecycle", daemon=True)
+        _lifecycle_thread.start()
+
+def stop_store_lifecycle():
+    global _lifecycle_thread
+    with _lifecycle_lock:
+        if _lifecycle_thread is None:
+            return
+        _lifecycle_stop.set()
+        _lifecycle_thread.join()
+        _lifecycle_thread = None
+    try:
+        record_store_activity(pop_store_accesses())
+    except Exception as e:
+        print(f"Error saving store activity: {str(e)}")
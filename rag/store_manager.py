@@ -0,0 +1,364 @@
+import os
+import logging
+import time
+import uuid
+import zlib
+import shutil
+import threading
+import chromadb
+from chromadb.config import Settings
+from chromadb.api.shared_system_client import SharedSystemClient
+from langchain_chroma import Chroma
+from rag.embeddings import get_embeddings
+from rag.session_store import SessionStore
+from rag.exact_store import ExactStore, snapshot_exists, write_snapshot
+from rag.store_archive import write_archive, read_archive
+from rag.lexical_index import LexicalIndex, get_index_path, load_index, save_index, drop_index, delete_index
+from utils.cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_ROOT = "vector_store"
+# "directory" keeps one Chroma directory per session; "shared" keeps every session in
+# one persistent client, spread over SHARED_STORE_SHARDS collections by user.
+VECTOR_STORE_MODE = os.environ.get("VECTOR_STORE_MODE", "directory")
+SHARED_STORE_SHARDS = int(os.environ.get("SHARED_STORE_SHARDS", "1"))
+SHARED_STORE_DIRECTORY = f"{VECTOR_STORE_ROOT}/_shared"
+STORE_CACHE_MAX_ENTRIES = int(os.environ.get("STORE_CACHE_MAX_ENTRIES", "64"))
+STORE_CACHE_MAX_MB = int(os.environ.get("STORE_CACHE_MAX_MB", "512"))
+# Rough resident cost of one chunk: float32 vector, HNSW links, text and metadata.
+STORE_CACHE_BYTES_PER_CHUNK = 3 * 1024
+STORE_CACHE_BYTES_PER_STORE = 1024 * 1024
+# Stores up to this many chunks are searched exactly from a memory-mapped snapshot
+# instead of through Chroma; 0 disables the snapshots.
+EXACT_SEARCH_MAX_CHUNKS = int(os.environ.get("EXACT_SEARCH_MAX_CHUNKS", "5000"))
+EXACT_DIRECTORY_NAME = "exact"
+# Inactive stores are compacted into STORE_ARCHIVE_DIRECTORY and restored on next use;
+# deleted store directories are moved to STORE_TRASH_DIRECTORY and removed in the background.
+STORE_ARCHIVE_DIRECTORY = f"{VECTOR_STORE_ROOT}/_archive"
+STORE_TRASH_DIRECTORY = f"{VECTOR_STORE_ROOT}/_trash"
+
+def get_store_key(user_id, store_name="default"):
+    return f"{user_id}_{store_name}"
+
+def get_persist_directory(user_id, store_name="default"):
+    return f"{VECTOR_STORE_ROOT}/{get_store_key(user_id, store_name)}"
+
+def iter_store_directories():
+    # Yields (path, user_id, store_name) for every directory-layout store. Names are
+    # "{user_id}_{store_name}" and owners (UUIDs, or the shared source owner) have no
+    # underscores; "_"-prefixed directories hold the archive, trash and shared layout.
+    if not os.path.isdir(VECTOR_STORE_ROOT):
+        return
+    for name in sorted(os.listdir(VECTOR_STORE_ROOT)):
+        path = os.path.join(VECTOR_STORE_ROOT, name)
+        if name.startswith("_") or "_" not in name or not os.path.isdir(path):
+            continue
+        user_id, store_name = name.split("_", 1)
+        yield path, user_id, store_name
+
+def is_shared_mode():
+    return VECTOR_STORE_MODE == "shared"
+
+def get_shard_name(user_id):
+    return f"sessions_{zlib.crc32(user_id.encode('utf-8')) % SHARED_STORE_SHARDS:02d}"
+
+def get_session_scope(user_id, store_name="default"):
+    return {"user_id": user_id, "session_id": store_name}
+
+_shared_client = None
+_shared_collections = {}
+_shared_lock = threading.Lock()
+
+def _get_shared_collection(user_id):
+    global _shared_client
+    shard_name = get_shard_name(user_id)
+    with _shared_lock:
+        if _shared_client is None:
+            os.makedirs(f"{SHARED_STORE_DIRECTORY}/lexical", exist_ok=True)
+            _shared_client = chromadb.PersistentClient(
+                path=SHARED_STORE_DIRECTORY,
+                settings=Settings(anonymized_telemetry=False)
+            )
+        if shard_name not in _shared_collections:
+            _shared_collections[shard_name] = Chroma(
+                client=_shared_client,
+                embedding_function=get_embeddings(),
+                collection_name=shard_name
+            )
+        return _shared_collections[shard_name]
+
+def get_shared_session_store(user_id, store_name="default"):
+    return SessionStore(_get_shared_collection(user_id), get_session_scope(user_id, store_name))
+
+_store_locks = {}
+_store_locks_guard = threading.Lock()
+_last_access = {}
+_last_access_lock = threading.Lock()
+
+def store_lock(user_id, store_name="default"):
+    # Serializes writes to one store (Chroma, lexical index and snapshot) within this process.
+    with _store_locks_guard:
+        return _store_locks.setdefault(get_store_key(user_id, store_name), threading.RLock())
+
+def _record_access(user_id, store_name):
+    with _last_access_lock:
+        _last_access[(user_id, store_name)] = time.time()
+
+def pop_store_accesses():
+    # Accesses are kept in memory and written out by the lifecycle pass, not on every query.
+    global _last_access
+    with _last_access_lock:
+        accesses, _last_access = _last_access, {}
+    return [(user_id, store_name, accessed_at) for (user_id, store_name), accessed_at in accesses.items()]
+
+def get_archive_path(user_id, store_name="default"):
+    return f"{STORE_ARCHIVE_DIRECTORY}/{get_store_key(user_id, store_name)}.npz"
+
+def is_store_archived(user_id, store_name="default"):
+    return os.path.exists(get_archive_path(user_id, store_name))
+
+def store_exists(user_id, store_name="default"):
+    return _live_store_exists(user_id, store_name) or is_store_archived(user_id, store_name)
+
+def _live_store_exists(user_id, store_name="default"):
+    if not is_shared_mode():
+        return os.path.exists(get_persist_directory(user_id, store_name))
+    if get_store_key(user_id, store_name) in _store_cache:
+        return True
+    if EXACT_SEARCH_MAX_CHUNKS and snapshot_exists(get_exact_snapshot_path(user_id, store_name)):
+        return True
+    return _build_vector_store(user_id, store_name).exists()
+
+def _approx_store_bytes(entry):
+    _, chunk_count = entry
+    return STORE_CACHE_BYTES_PER_STORE + chunk_count * STORE_CACHE_BYTES_PER_CHUNK
+
+def get_exact_snapshot_path(user_id, store_name="default"):
+    if is_shared_mode():
+        return f"{SHARED_STORE_DIRECTORY}/{EXACT_DIRECTORY_NAME}/{get_store_key(user_id, store_name)}"
+    return os.path.join(get_persist_directory(user_id, store_name), EXACT_DIRECTORY_NAME)
+
+def use_exact_search(chunk_count):
+    return 0 < chunk_count <= EXACT_SEARCH_MAX_CHUNKS
+
+def _write_exact_snapshot(user_id, store_name, vector_store):
+    path = get_exact_snapshot_path(user_id, store_name)
+    data = vector_store.get(include=["embeddings", "documents", "metadatas"])
+    write_snapshot(path, data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+    return ExactStore(path)
+
+def _drop_exact_snapshot(user_id, store_name):
+    shutil.rmtree(get_exact_snapshot_path(user_id, store_name), ignore_errors=True)
+
+def _open_exact_snapshot(user_id, store_name, vector_store, chunk_count):
+    path = get_exact_snapshot_path(user_id, store_name)
+    if snapshot_exists(path):
+        snapshot = ExactStore(path)
+        # A snapshot that does not hold every chunk in Chroma missed a write, e.g. one
+        # made by another process, and is not trusted.
+        if snapshot.count() == chunk_count:
+            return snapshot
+    lock = store_lock(user_id, store_name)
+    if not lock.acquire(blocking=False):
+        # A write is in progress and refreshes the snapshot when it finishes.
+        return vector_store
+    try:
+        return _write_exact_snapshot(user_id, store_name, vector_store)
+    finally:
+        lock.release()
+
+_store_cache = LRUCache(
+    max_entries=STORE_CACHE_MAX_ENTRIES,
+    max_bytes=STORE_CACHE_MAX_MB * 1024 * 1024,
+    sizeof=_approx_store_bytes,
+)
+
+def _build_vector_store(user_id, store_name):
+    if is_shared_mode():
+        return get_shared_session_store(user_id, store_name)
+    return SessionStore(Chroma(
+        persist_directory=get_persist_directory(user_id, store_name),
+        embedding_function=get_embeddings(),
+        collection_name=get_store_key(user_id, store_name)
+    ))
+
+def _get_cached_store(user_id, store_name):
+    key = get_store_key(user_id, store_name)
+    entry = _store_cache.get(key)
+    if entry is not None:
+        # Another process may have archived or deleted the store since it was cached.
+        if is_shared_mode():
+            if not is_store_archived(user_id, store_name):
+                return entry[0]
+        elif os.path.exists(get_persist_directory(user_id, store_name)):
+            return entry[0]
+        _store_cache.pop(key)
+    return None
+
+def _restore_archived_store(user_id, store_name):
+    with store_lock(user_id, store_name):
+        archive_path = get_archive_path(user_id, store_name)
+        if not os.path.exists(archive_path):
+            return
+        start = time.perf_counter()
+        ids, vectors, documents, metadatas = read_archive(archive_path)
+        if not is_shared_mode():
+            os.makedirs(get_persist_directory(user_id, store_name), exist_ok=True)
+        vector_store = _build_vector_store(user_id, store_name)
+        max_batch_size = vector_store.max_batch_size
+        for i in range(0, len(ids), max_batch_size):
+            vector_store.upsert(
+                ids=ids[i:i + max_batch_size],
+                embeddings=vectors[i:i + max_batch_size].tolist(),
+                documents=documents[i:i + max_batch_size],
+                metadatas=metadatas[i:i + max_batch_size]
+            )
+        os.remove(archive_path)
+        cache_vector_store(user_id, store_name, vector_store)
+        logger.info("Restored archived store %s (%d chunks) in %.1f s",
+                    get_store_key(user_id, store_name), len(ids), time.perf_counter() - start)
+
+def archive_vector_store(user_id, store_name="default"):
+    # The lexical index and exact snapshot are not archived; both are rebuilt from the
+    # restored store.
+    with store_lock(user_id, store_name):
+        if not _live_store_exists(user_id, store_name):
+            return False
+        vector_store = _build_vector_store(user_id, store_name)
+        data = vector_store.get(include=["embeddings", "documents", "metadatas"])
+        if data["ids"]:
+            write_archive(get_archive_path(user_id, store_name), data["ids"], data["embeddings"],
+                          data["documents"], data["metadatas"])
+        _delete_live_store(user_id, store_name)
+        return bool(data["ids"])
+
+def open_vector_store(user_id, store_name="default"):
+    _record_access(user_id, store_name)
+    vector_store = _get_cached_store(user_id, store_name)
+    if vector_store is not None:
+        return vector_store
+
+    if is_store_archived(user_id, store_name):
+        _restore_archived_store(user_id, store_name)
+    if not _live_store_exists(user_id, store_name):
+        return None
+
+    vector_store = _build_vector_store(user_id, store_name)
+    chunk_count = vector_store.count()
+    if use_exact_search(chunk_count):
+        vector_store = _open_exact_snapshot(user_id, store_name, vector_store, chunk_count)
+
+    if chunk_count == 0:
+        return None
+
+    _store_cache.put(get_store_key(user_id, store_name), (vector_store, chunk_count))
+    return vector_store
+
+def get_or_create_vector_store(user_id, store_name="default"):
+    # Writes always go to Chroma; a cached snapshot is read-only.
+    _record_access(user_id, store_name)
+    vector_store = _get_cached_store(user_id, store_name)
+    if isinstance(vector_store, SessionStore):
+        return vector_store
+
+    if is_store_archived(user_id, store_name):
+        _restore_archived_store(user_id, store_name)
+
+    if not is_shared_mode():
+        os.makedirs(get_persist_directory(user_id, store_name), exist_ok=True)
+    return _build_vector_store(user_id, store_name)
+
+def cache_vector_store(user_id, store_name, vector_store):
+    # Called once a write job is done; rebuilds the snapshot from what Chroma holds now.
+    with store_lock(user_id, store_name):
+        chunk_count = vector_store.count()
+        if chunk_count == 0:
+            invalidate_vector_store(user_id, store_name)
+            _drop_exact_snapshot(user_id, store_name)
+            return
+        if use_exact_search(chunk_count):
+            vector_store = _write_exact_snapshot(user_id, store_name, vector_store)
+        else:
+            _drop_exact_snapshot(user_id, store_name)
+        _store_cache.put(get_store_key(user_id, store_name), (vector_store, chunk_count))
+
+def mark_store_changed(user_id, store_name="default"):
+    # For writes in the middle of a job: searches go to Chroma until cache_vector_store
+    # publishes the next snapshot.
+    with store_lock(user_id, store_name):
+        _store_cache.pop(get_store_key(user_id, store_name))
+        _drop_exact_snapshot(user_id, store_name)
+
+def invalidate_vector_store(user_id, store_name="default"):
+    _store_cache.pop(get_store_key(user_id, store_name))
+    drop_index(get_lexical_index_path(user_id, store_name))
+
+def delete_store_data(user_id, store_name="default"):
+    archived = is_store_archived(user_id, store_name)
+    if archived:
+        os.remove(get_archive_path(user_id, store_name))
+    return _delete_live_store(user_id, store_name) or archived
+
+def _release_chroma_system(persist_directory):
+    # chromadb keeps one system per path for the life of the process. Once the directory
+    # is moved away that system points at the moved files, so a store restored or
+    # re-created at the same path would open read-only; the next client starts a fresh one.
+    system = SharedSystemClient._identifier_to_system.pop(persist_directory, None)
+    if system is not None:
+        system.stop()
+
+def _delete_live_store(user_id, store_name="default"):
+    invalidate_vector_store(user_id, store_name)
+    if not is_shared_mode():
+        persist_directory = get_persist_directory(user_id, store_name)
+        if not os.path.exists(persist_directory):
+            return False
+        _release_chroma_system(persist_directory)
+        # A rename is instant; empty_store_trash removes the files in the background.
+        os.makedirs(STORE_TRASH_DIRECTORY, exist_ok=True)
+        os.rename(persist_directory, f"{STORE_TRASH_DIRECTORY}/{get_store_key(user_id, store_name)}-{uuid.uuid4().hex}")
+        return True
+
+    vector_store = _build_vector_store(user_id, store_name)
+    if not vector_store.exists():
+        return False
+    vector_store.delete_all()
+    _drop_exact_snapshot(user_id, store_name)
+    delete_index(get_lexical_index_path(user_id, store_name))
+    return True
+
+def empty_store_trash():
+    if not os.path.isdir(STORE_TRASH_DIRECTORY):
+        return 0
+    removed = 0
+    for name in os.listdir(STORE_TRASH_DIRECTORY):
+        shutil.rmtree(os.path.join(STORE_TRASH_DIRECTORY, name), ignore_errors=True)
+        removed += 1
+    return removed
+
+def get_shared_lexical_index_path(user_id, store_name="default"):
+    return f"{SHARED_STORE_DIRECTORY}/lexical/{get_store_key(user_id, store_name)}.json"
+
+def get_lexical_index_path(user_id, store_name="default"):
+    if is_shared_mode():
+        return get_shared_lexical_index_path(user_id, store_name)
+    return get_index_path(get_persist_directory(user_id, store_name))
+
+def build_lexical_index(vector_store):
+    index = LexicalIndex()
+    data = vector_store.get(include=["documents"])
+    index.add(data["ids"], data["documents"])
+    return index
+
+def open_lexical_index(user_id, store_name, vector_store):
+    path = get_lexical_index_path(user_id, store_name)
+    index = load_index(path)
+    if index is None:
+        # Stores ingested before the lexical index existed get one built on first use.
+        index = build_lexical_index(vector_store)
+        save_index(index, path)
+    return index
+
+def get_store_cache_stats():
+    return _store_cache.stats()
@@ -1,12 +1,28 @@
-import os
 from youtube_transcript_api import YouTubeTranscriptApi
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from rag.ingest_utils import report, split_into_chunks, persist_chunks
+from rag.shared_sources import SHARE_SOURCES, fingerprint_origin, ingest_shared_source
 
-def process_youtube(video_url, user_id, store_name = "default"):
+def process_youtube(video_url, user_id, store_name = "default", progress=None):
+    if not SHARE_SOURCES:
+        return ingest_youtube(video_url, user_id, store_name, progress)
+
+    try:
+        fingerprint = fingerprint_origin("youtube", get_youtube_video_id(video_url))
+        return ingest_shared_source(
+            user_id, store_name, fingerprint, "youtube", video_url, video_url,
+            lambda owner, source_store: ingest_youtube(video_url, owner, source_store, progress),
+            progress
+        )
+
+    except Exception as e:
+        print(f"Error processing YouTube video: {e}")
+        report(progress, "failed", error=str(e))
+        return None
+
+def ingest_youtube(video_url, user_id, store_name = "default", progress=None):
     try:
+        report(progress, "parse")
         transcript_text = fetch_youtube_transcript(video_url)
 
         if not transcript_text.strip():
@@ -15,44 +31,25 @@ def process_youtube(video_url, user_id, store_name = "default"):
 
         docs = [Document(page_content=transcript_text, metadata={"source": video_url})]
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        chunks = text_splitter.split_documents(docs)
-
-        embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={"device": "cpu"},
-            encode_kwargs={"normalize_embeddings": True}
-        )
-
-        persist_directory = f"vector_store/{user_id}_{store_name}"
-        os.makedirs(persist_directory, exist_ok=True)
+        chunks = split_into_chunks(docs, progress)
 
-        vector_store = Chroma.from_documents(
-            chunks,
-            embeddings,
-            persist_directory=persist_directory,
-            collection_name=f"{user_id}_{store_name}"
-        )
-
-        return vector_store
+        return persist_chunks(chunks, user_id, store_name, progress)
 
     except Exception as e:
         print(f"Error processing YouTube video: {e}")
+        report(progress, "failed", error=str(e))
         return None
     
+def get_youtube_video_id(video_url):
+    if "v=" in video_url:
+        return video_url.split("v=")[-1].split("&")[0]
+    if "youtu.be/" in video_url:
+        return video_url.split("youtu.be/")[-1].split("?")[0]
+    raise ValueError("Invalid YouTube URL format")
+
 def fetch_youtube_transcript(video_url):
     try:
-        if "v=" in video_url:
-            video_id = video_url.split("v=")[-1].split("&")[0]
-        elif "youtu.be/" in video_url:
-            video_id = video_url.split("youtu.be/")[-1].split("?")[0]
-        else:
-            raise ValueError("Invalid YouTube URL format")
-
+        video_id = get_youtube_video_id(video_url)
         transcript = YouTubeTranscriptApi().fetch(video_id, languages=['en', 'hi'])
         
         return " ".join([item.text for item in transcript])
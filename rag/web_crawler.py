@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import asyncio
+import hashlib
+import threading
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urljoin, urldefrag, urlparse
+import httpx
+from bs4 import BeautifulSoup
+
+CRAWL_MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", "50"))
+CRAWL_MAX_DEPTH = int(os.environ.get("CRAWL_MAX_DEPTH", "2"))
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", "8"))
+CRAWL_TIMEOUT_SECONDS = float(os.environ.get("CRAWL_TIMEOUT_SECONDS", "15"))
+CRAWL_CACHE_PATH = os.environ.get("CRAWL_CACHE_PATH", "crawl_cache.db")
+CRAWL_USER_AGENT = "multi-purpose-rag-crawler/1.0"
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".tar", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico",
+    ".css", ".js", ".json", ".xml", ".mp3", ".mp4", ".webm", ".woff", ".woff2", ".ttf",
+)
+SITEMAP_NAMESPACE = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+_cache_lock = threading.Lock()
+_cache_conn = None
+
+def _get_cache_connection():
+    global _cache_conn
+    if _cache_conn is None:
+        _cache_conn = sqlite3.connect(CRAWL_CACHE_PATH, check_same_thread=False)
+        _cache_conn.execute("PRAGMA journal_mode=WAL")
+        _cache_conn.execute('''
+            CREATE TABLE IF NOT EXISTS pages (
+                store_key TEXT NOT NULL,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                links TEXT,
+                fetched_at REAL,
+                PRIMARY KEY (store_key, url)
+            )
+        ''')
+        _cache_conn.commit()
+    return _cache_conn
+
+def load_page_validators(store_key):
+    with _cache_lock:
+        rows = _get_cache_connection().execute('''
+            SELECT url, etag, last_modified, content_hash, links FROM pages WHERE store_key = ?
+        ''', (store_key,)).fetchall()
+    return {
+        url: {"etag": etag, "last_modified": last_modified, "content_hash": content_hash, "links": json.loads(links or "[]")}
+        for url, etag, last_modified, content_hash, links in rows
+    }
+
+def save_page_validators(store_key, pages):
+    # Called only once a page's chunks are persisted, so a failed ingestion is re-fetched next time.
+    with _cache_lock:
+        conn = _get_cache_connection()
+        with conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO pages (store_key, url, etag, last_modified, content_hash, links, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', [(store_key, page["url"], page["etag"], page["last_modified"], page["content_hash"],
+                   json.dumps(page["links"]), time.time()) for page in pages])
+
+def forget_page_validators(store_key):
+    with _cache_lock:
+        conn = _get_cache_connection()
+        with conn:
+            conn.execute("DELETE FROM pages WHERE store_key = ?", (store_key,))
+
+def normalize_url(url):
+    url, _ = urldefrag(url)
+    parsed = urlparse(url)
+    if parsed.path == "":
+        url = parsed._replace(path="/").geturl()
+    return url
+
+def extract_page(html, url):
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        links.append(normalize_url(urljoin(url, anchor["href"])))
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    text = soup.get_text(separator="\n", strip=True)
+    return title, text, links
+
+def parse_sitemap(xml_text):
+    try:
+        root = ElementTree.fromstring(xml_text)
+    except ElementTree.ParseError:
+        return [], []
+    locations = [element.text.strip() for element in root.iter(f"{SITEMAP_NAMESPACE}loc") if element.text]
+    if root.tag == f"{SITEMAP_NAMESPACE}sitemapindex":
+        return [], locations
+    return locations, []
+
+class SiteCrawler:
+    # Breadth-first, same-host crawl with a fixed pool of fetch workers sharing one
+    # pooled HTTP client. Pages are handed to on_page as soon as they are parsed.
+    def __init__(self, start_url, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH,
+                 concurrency=CRAWL_CONCURRENCY, validators=None, use_sitemap=True):
+        self.start_url = normalize_url(start_url)
+        self.host = urlparse(self.start_url).netloc
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.validators = validators or {}
+        self.use_sitemap = use_sitemap
+        self.stats = {"pages_fetched": 0, "pages_unchanged": 0, "pages_failed": 0}
+        # Pages that answered with 200 or 304. A crawl with transient failures (network
+        # errors, 429s, 5xxs) is incomplete: pages it did not reach may still exist.
+        self.reached = set()
+        self.complete = True
+        self._seen = set()
+        self._queue = None
+
+    def _in_scope(self, url):
+        parsed = urlparse(url)
+        return (parsed.scheme in ("http", "https") and parsed.netloc == self.host
+                and not parsed.path.lower().endswith(SKIPPED_EXTENSIONS))
+
+    def _enqueue(self, url, depth):
+        if depth > self.max_depth or url in self._seen or len(self._seen) >= self.max_pages:
+            return
+        if not self._in_scope(url):
+            return
+        self._seen.add(url)
+        self._queue.put_nowait((url, depth))
+
+    async def _discover_sitemap(self, client):
+        parsed = urlparse(self.start_url)
+        pending = [f"{parsed.scheme}://{parsed.netloc}/sitemap.xml"]
+        # Sitemap indexes are followed one level down.
+        for _ in range(2):
+            nested = []
+            for sitemap_url in pending:
+                try:
+                    response = await client.get(sitemap_url)
+                except httpx.HTTPError:
+                    self.complete = False
+                    continue
+                if response.status_code != 200:
+                    if response.status_code == 429 or response.status_code >= 500:
+                        self.complete = False
+                    continue
+                urls, sitemaps = parse_sitemap(response.text)
+                for url in urls:
+                    self._enqueue(normalize_url(url), 1)
+                nested.extend(sitemaps)
+            pending = nested
+
+    async def _fetch(self, client, url, depth, on_page):
+        cached = self.validators.get(url)
+        headers = {}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            print(f"Error crawling {url}: {str(e)}")
+            self.stats["pages_failed"] += 1
+            self.complete = False
+            return
+
+        if response.status_code == 304 and cached:
+            self.stats["pages_unchanged"] += 1
+            self.reached.add(url)
+            links = cached["links"]
+        elif response.status_code == 200 and "html" in response.headers.get("content-type", "html"):
+            final_url = normalize_url(str(response.url))
+            if final_url != url and not self._in_scope(final_url):
+                return
+            self.reached.add(url)
+            content_hash = hashlib.sha256(response.content).hexdigest()
+            title, text, links = extract_page(response.text, url)
+            page = {
+                "url": url,
+                "title": title,
+                "text": text,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "content_hash": content_hash,
+                "links": links,
+            }
+            if cached and cached["content_hash"] == content_hash:
+                # Servers without validators still send the same bytes for an unchanged page.
+                self.stats["pages_unchanged"] += 1
+            else:
+                self.stats["pages_fetched"] += 1
+                on_page(page)
+        else:
+            self.stats["pages_failed"] += 1
+            if response.status_code == 429 or response.status_code >= 500:
+                self.complete = False
+            return
+
+        for link in links:
+            self._enqueue(link, depth + 1)
+
+    async def _worker(self, client, on_page):
+        while True:
+            url, depth = await self._queue.get()
+            try:
+                await self._fetch(client, url, depth, on_page)
+            finally:
+                self._queue.task_done()
+
+    async def crawl(self, on_page):
+        self._queue = asyncio.Queue()
+        self._seen = set()
+        self.reached = set()
+        self.complete = True
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(
+            limits=limits,
+            timeout=CRAWL_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            headers={"User-Agent": CRAWL_USER_AGENT}
+        ) as client:
+            self._enqueue(self.start_url, 0)
+            workers = [asyncio.create_task(self._worker(client, on_page)) for _ in range(self.concurrency)]
+            if self.use_sitemap:
+                await self._discover_sitemap(client)
+            await self._queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.stats
+
+def iter_crawl(crawler):
+    # Runs the async crawl on its own thread and yields pages as they arrive, so the
+    # caller can split and embed while later pages are still being fetched.
+    pages = queue.Queue()
+    done = object()
+    errors = []
+
+    def run():
+        try:
+            asyncio.run(crawler.crawl(pages.put))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            pages.put(done)
+
+    thread = threading.Thread(target=run, name="crawler", daemon=True)
+    thread.start()
+    while True:
+        page = pages.get()
+        if page is done:
+            break
+        yield page
+    thread.join()
+    if errors:
+        raise errors[0]
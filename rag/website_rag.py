@@ -1,49 +1,98 @@
-import os
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_chroma import Chroma
-
-def process_website(url, user_id, store_name="default"):
-    
-    docs = []
-    
+import logging
+import time
+from langchain_core.documents import Document
+from rag.ingest_utils import report, cumulative_progress, split_into_chunks, persist_chunks, list_sources, remove_source
+from rag.store_manager import get_store_key, open_vector_store, get_or_create_vector_store, cache_vector_store
+from rag.shared_sources import SHARE_SOURCES, fingerprint_origin, ingest_shared_source
+from rag.web_crawler import SiteCrawler, iter_crawl, normalize_url, load_page_validators, save_page_validators
+
+logger = logging.getLogger(__name__)
+
+# Pages are split and embedded in batches while the crawl continues.
+CRAWL_PERSIST_BATCH_PAGES = 8
+
+def process_website(url, user_id, store_name="default", progress=None):
+    if not SHARE_SOURCES:
+        return crawl_website(url, user_id, store_name, progress)
+
     try:
-        loader = WebBaseLoader(url)
-        docs = loader.load()
-        
-        if not docs:
-            return None
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        
-        chunks = text_splitter.split_documents(docs)
-        
-        if not chunks:
-            return None
-        
-        embeddings = HuggingFaceEmbeddings(
-            model_name="all-MiniLM-L6-v2",
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
+        fingerprint = fingerprint_origin("website", normalize_url(url))
+        return ingest_shared_source(
+            user_id, store_name, fingerprint, "website", url, normalize_url(url),
+            lambda owner, source_store: crawl_website(url, owner, source_store, progress),
+            progress, refreshable=True
         )
-        
-        persist_directory = f"vector_store/{user_id}_{store_name}"
-        os.makedirs(persist_directory, exist_ok=True)
-        
-        vector_store = Chroma.from_documents(
-            chunks, 
-            embeddings,
-            persist_directory=persist_directory,
-            collection_name=f"{user_id}_{store_name}"
-        )
-        
+
+    except Exception as e:
+        print(f"Error processing website: {str(e)}")
+        report(progress, "failed", error=str(e))
+        return None
+
+def crawl_website(url, user_id, store_name="default", progress=None):
+
+    try:
+        report(progress, "crawl")
+        store_key = get_store_key(user_id, store_name)
+        # Validators are only trusted for pages whose chunks are still in the store.
+        stored_sources = {source["source"] for source in list_sources(user_id, store_name)}
+        validators = {
+            page_url: page for page_url, page in load_page_validators(store_key).items() if page_url in stored_sources
+        }
+        crawler = SiteCrawler(url, validators=validators)
+
+        vector_store = None
+        totals = {}
+        batch = []
+        start = time.perf_counter()
+
+        def flush():
+            nonlocal vector_store
+            docs = [
+                Document(page_content=page["text"], metadata={"source": page["url"], "title": page["title"]})
+                for page in batch if page["text"]
+            ]
+            chunks = split_into_chunks(docs, cumulative_progress(progress, totals))
+            if chunks:
+                vector_store = persist_chunks(chunks, user_id, store_name, cumulative_progress(progress, totals),
+                                              refresh_snapshot=False)
+            save_page_validators(store_key, batch)
+            batch.clear()
+
+        for page in iter_crawl(crawler):
+            batch.append(page)
+            elapsed = time.perf_counter() - start
+            report(progress, "crawl", pages_fetched=crawler.stats["pages_fetched"],
+                   pages_unchanged=crawler.stats["pages_unchanged"],
+                   pages_per_second=round(crawler.stats["pages_fetched"] / elapsed, 2) if elapsed else None)
+            if len(batch) >= CRAWL_PERSIST_BATCH_PAGES:
+                flush()
+        if batch:
+            flush()
+
+        # Pages that are gone from the site (404s, or no longer linked) leave the store,
+        # unless transient failures may have kept the crawl from reaching them.
+        gone = stored_sources - crawler.reached if crawler.complete else set()
+        chunks_removed = sum(remove_source(user_id, store_name, source, refresh_snapshot=False) for source in gone)
+        if gone:
+            report(cumulative_progress(progress, totals), "persist", chunks_removed=chunks_removed)
+            vector_store = vector_store or get_or_create_vector_store(user_id, store_name)
+        if vector_store is not None:
+            cache_vector_store(user_id, store_name, vector_store)
+
+        elapsed = time.perf_counter() - start
+        stats = crawler.stats
+        pages_seen = stats["pages_fetched"] + stats["pages_unchanged"]
+        report(progress, "persist", pages_fetched=stats["pages_fetched"], pages_unchanged=stats["pages_unchanged"],
+               pages_per_second=round(pages_seen / elapsed, 2) if elapsed else None)
+        logger.info("Crawled %s: %d pages fetched, %d unchanged, %d failed, %d removed in %.1f s", url,
+                    stats["pages_fetched"], stats["pages_unchanged"], stats["pages_failed"], len(gone), elapsed)
+
+        if vector_store is None and stats["pages_unchanged"]:
+            # Nothing changed since the last crawl; the existing store is still current.
+            return open_vector_store(user_id, store_name)
         return vector_store
-    
+
     except Exception as e:
         print(f"Error processing documents: {str(e)}")
-        return None
\ No newline at end of file
+        report(progress, "failed", error=str(e))
+        return None
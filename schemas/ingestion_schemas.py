@@ -0,0 +1,46 @@
+from pydantic import BaseModel
+
+class IngestUrlRequest(BaseModel):
+    url: str
+
+class IngestJobResponse(BaseModel):
+    job_id: str
+    status: str
+
+class IngestionJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    user_id: str
+    session_id: str
+    status: str
+    stage: str
+    files_total: int | None = None
+    files_parsed: int | None = None
+    documents: int | None = None
+    chunks_total: int | None = None
+    chunks_embedded: int | None = None
+    chunks_new: int | None = None
+    chunks_unchanged: int | None = None
+    chunks_removed: int | None = None
+    pages_fetched: int | None = None
+    pages_unchanged: int | None = None
+    pages_per_second: float | None = None
+    sources_linked: int | None = None
+    embed_chunks_per_second: float | None = None
+    embedding_cache_hits: int | None = None
+    embedding_cache_hit_rate: float | None = None
+    embedding_time_saved_ms: float | None = None
+    chunks_per_second: float | None = None
+    elapsed_seconds: float | None = None
+    error: str | None = None
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+
+class SourceDetails(BaseModel):
+    source: str
+    chunks: int
+
+class RemoveSourceResponse(BaseModel):
+    success: bool
+    chunks_removed: int
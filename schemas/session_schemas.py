@@ -1,14 +1,33 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class AskRequest(BaseModel):
     user_id: str
     session_id: str
     query: str
+
+class AskBatchRequest(BaseModel):
+    user_id: str
+    session_id: str
+    queries: List[str]
+    concurrency: Optional[int] = None
+    save_messages: bool = False
     
+class ContextStats(BaseModel):
+    chunks_in: int
+    chunks_out: int
+    tokens_in: int
+    tokens_out: int
+    tokens_saved: int
+
 class AskResponse(BaseModel):
     success: bool
     answer: str
+    cached: bool = False
+    context_stats: ContextStats | None = None
+
+class SessionSettings(BaseModel):
+    answer_cache: bool
     
 class DelSessionResponse(BaseModel):
     success: bool
@@ -30,4 +49,18 @@ class Message(BaseModel):
 class SessionDetails(BaseModel):
     session_id: str
     creation_time: str
-    conversation: List[Message]
\ No newline at end of file
+    conversation: List[Message]
+
+class SessionSummary(BaseModel):
+    session_id: str
+    creation_time: str
+    message_count: int
+    last_activity: str
+
+class SessionSummaryPage(BaseModel):
+    sessions: List[SessionSummary]
+    next_cursor: Optional[str] = None
+
+class UserPage(BaseModel):
+    users: List[UserDetails]
+    next_cursor: Optional[str] = None
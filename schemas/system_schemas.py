@@ -0,0 +1,44 @@
+from pydantic import BaseModel
+
+class EmbeddingStatsResponse(BaseModel):
+    model_name: str
+    device: str
+    backend: str
+    backend_divergence: float | None
+    loaded: bool
+    load_time_ms: float | None
+    warmup_time_ms: float | None
+    rss_delta_mb: float | None
+    peak_rss_mb: float | None
+
+class CacheStatsResponse(BaseModel):
+    entries: int
+    max_entries: int | None
+    approx_bytes: int
+    max_bytes: int | None
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int = 0
+    hit_rate: float
+
+class EmbeddingCacheStatsResponse(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+    approx_bytes: int
+    max_bytes: int
+    embed_time_ms: float
+    time_saved_ms: float
+
+class AnswerCacheStatsResponse(BaseModel):
+    enabled: bool
+    threshold: float
+    entries: int
+    lookups: int
+    hits: int
+    hit_rate: float
+    time_saved_ms: float
+    evictions: int
+    expirations: int
@@ -0,0 +1,75 @@
+import os
+import sys
+import shutil
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+from chromadb.config import Settings
+from rag.lexical_index import LexicalIndex, get_index_path
+from rag.store_manager import VECTOR_STORE_ROOT, get_store_key, iter_store_directories, get_shared_session_store, get_shared_lexical_index_path
+
+PAGE_SIZE = 1000
+
+def migrate_session(path, user_id, store_name):
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    source = client.get_collection(get_store_key(user_id, store_name))
+    target = get_shared_session_store(user_id, store_name)
+
+    # Vectors are copied as stored, so nothing is re-embedded.
+    copied = 0
+    while True:
+        page = source.get(limit=PAGE_SIZE, offset=copied, include=["embeddings", "documents", "metadatas"])
+        if not page["ids"]:
+            break
+        target.upsert(page["ids"], page["embeddings"], page["documents"], page["metadatas"])
+        copied += len(page["ids"])
+
+    # Shared-mode chunk ids are the same as before, so the lexical index carries over;
+    # loading and saving it folds in its journal.
+    lexical_index_path = get_index_path(path)
+    if os.path.exists(lexical_index_path):
+        LexicalIndex.load(lexical_index_path).save(get_shared_lexical_index_path(user_id, store_name))
+
+    return copied, source.count(), target.count()
+
+def run(delete_source, dry_run):
+    if not os.path.isdir(VECTOR_STORE_ROOT):
+        print(f"No {VECTOR_STORE_ROOT}/ directory, nothing to migrate")
+        return
+
+    migrated = failed = 0
+    for path, user_id, store_name in iter_store_directories():
+        if dry_run:
+            print(f"Would migrate {path}")
+            continue
+        try:
+            copied, source_count, target_count = migrate_session(path, user_id, store_name)
+        except Exception as e:
+            print(f"Failed to migrate {path}: {str(e)}")
+            failed += 1
+            continue
+
+        if source_count != target_count:
+            print(f"Count mismatch for {path}: {source_count} in source, {target_count} in shared store; keeping source")
+            failed += 1
+            continue
+
+        print(f"Migrated {path}: {copied} chunks")
+        migrated += 1
+        if delete_source:
+            shutil.rmtree(path)
+
+    print(f"Migrated {migrated} sessions, {failed} failed")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Copy directory-per-session vector stores into the shared store used by VECTOR_STORE_MODE=shared"
+    )
+    parser.add_argument("--delete-source", action="store_true",
+                        help="remove each session directory once its chunk count matches in the shared store")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    run(args.delete_source, args.dry_run)
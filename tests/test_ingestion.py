@@ -0,0 +1,112 @@
+import os
+import sys
+import uuid
+import hashlib
+import math
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class HashEmbeddings(Embeddings):
+    # Bag of hashed words: deterministic, no model download, and texts sharing words
+    # land close together.
+    def _embed(self, text):
+        vector = [0.0] * 64
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % 64] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    # Stores, users.db and the caches live under relative paths, so every test in this
+    # module runs in one scratch directory through the real Chroma and SQLite code.
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("ingestion"))
+        import rag.embeddings
+        patch.setattr(rag.embeddings, "load_embeddings", lambda backend: HashEmbeddings())
+        from utils.db_utils import init_db
+        init_db()
+        yield
+
+def new_session():
+    return str(uuid.uuid4()), str(uuid.uuid4())
+
+def ingest(user_id, session_id, name, text):
+    from rag.document_rag import process_documents
+    from rag.ingest_utils import InMemoryUpload
+    events = []
+    vector_store = process_documents([InMemoryUpload(name, text.encode("utf-8"))], user_id, session_id,
+                                     lambda stage, **fields: events.append((stage, fields)))
+    assert vector_store is not None, events
+    return events
+
+def search(user_id, session_id, query):
+    from rag.document_rag import load_vector_store, load_lexical_index, query_documents
+    vector_store = load_vector_store(user_id, session_id)
+    return query_documents(vector_store, query, lexical_index=load_lexical_index(user_id, session_id, vector_store))
+
+def test_shared_document_ingestion(workdir):
+    from rag.shared_sources import list_session_sources
+    user_id, session_id = new_session()
+    ingest(user_id, session_id, "report.txt", "The refund policy allows returns within thirty days.")
+
+    docs = search(user_id, session_id, "refund policy")
+    assert [doc.metadata["source"] for doc in docs] == ["report.txt"]
+    assert "thirty days" in docs[0].page_content
+    assert list_session_sources(user_id, session_id) == [{"source": "report.txt", "chunks": 1}]
+
+def test_same_document_is_linked_not_reingested(workdir):
+    text = "Shipping takes three to five business days."
+    ingest(*new_session(), "shipping.txt", text)
+
+    user_id, session_id = new_session()
+    events = ingest(user_id, session_id, "delivery.txt", text)
+    assert ("linked", {"sources_linked": 1}) in events
+    assert [doc.metadata["source"] for doc in search(user_id, session_id, "shipping")] == ["delivery.txt"]
+
+def test_archived_store_is_restored(workdir):
+    from rag.document_rag import ingest_documents
+    from rag.ingest_utils import InMemoryUpload
+    from rag.store_manager import archive_vector_store, empty_store_trash
+    user_id, session_id = new_session()
+    assert ingest_documents([InMemoryUpload("notes.txt", b"The office opens at nine.")], user_id, session_id)
+    assert search(user_id, session_id, "office")
+
+    assert archive_vector_store(user_id, session_id)
+    # In the directory layout the store's directory went to the trash; the restore
+    # recreates it in the same process, at the same path.
+    empty_store_trash()
+    assert [doc.page_content for doc in search(user_id, session_id, "office")] == ["The office opens at nine."]
+
+def test_released_source_can_be_ingested_again(workdir):
+    from rag.shared_sources import remove_session_source
+    from rag.store_manager import empty_store_trash
+    user_id, session_id = new_session()
+    text = "Support is available on weekdays."
+    ingest(user_id, session_id, "support.txt", text)
+    assert remove_session_source(user_id, session_id, "support.txt") == 1
+    empty_store_trash()
+
+    ingest(user_id, session_id, "support.txt", text)
+    assert [doc.page_content for doc in search(user_id, session_id, "support")] == [text]
+
+def test_changed_document_replaces_previous_version(workdir):
+    from rag.shared_sources import list_session_sources, is_source_stored, fingerprint_bytes
+    user_id, session_id = new_session()
+    old_text = "Invoices are due within sixty days."
+    ingest(user_id, session_id, "report.txt", old_text)
+    ingest(user_id, session_id, "report.txt", "Invoices are due within fifteen days.")
+
+    assert list_session_sources(user_id, session_id) == [{"source": "report.txt", "chunks": 1}]
+    assert [doc.page_content for doc in search(user_id, session_id, "invoices due")] == ["Invoices are due within fifteen days."]
+    # No other session linked the old version, so its store is gone.
+    assert not is_source_stored(fingerprint_bytes(old_text.encode("utf-8")))
@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.lexical_index import LexicalIndex, get_index_path, get_journal_path, load_index, save_index, update_index, drop_index
+
+def make_index(tmp_path):
+    index = LexicalIndex()
+    index.add(["a", "b"], ["error E1042 on login", "password reset steps"])
+    path = get_index_path(str(tmp_path))
+    save_index(index, path)
+    return index, path
+
+def hits(index, query):
+    return [chunk_id for chunk_id, _ in index.search(query)]
+
+def test_updates_are_journaled_not_rewritten(tmp_path):
+    index, path = make_index(tmp_path)
+    mtime = os.stat(path).st_mtime_ns
+
+    update_index(index, path, ["c"], ["quota exceeded E2001"], ["a"], ["error E1042 on login"])
+    assert hits(index, "E2001") == ["c"]
+    assert hits(index, "E1042") == []
+    assert os.stat(path).st_mtime_ns == mtime
+    assert os.path.exists(get_journal_path(path))
+
+    # A fresh load, as after a restart, replays the journal over the file.
+    drop_index(path)
+    reloaded = load_index(path)
+    assert reloaded is not index
+    assert sorted(reloaded.doc_lengths) == ["b", "c"]
+    assert hits(reloaded, "E2001") == ["c"]
+
+def test_cached_index_catches_up_with_other_writers(tmp_path):
+    index, path = make_index(tmp_path)
+    # Another process loads the same files and appends to the journal.
+    LexicalIndex.load(path).update(path, ["c"], ["quota exceeded E2001"])
+    assert load_index(path) is index
+    assert hits(index, "E2001") == ["c"]
+
+def test_journal_is_compacted_into_the_file(tmp_path):
+    index, path = make_index(tmp_path)
+    texts = [f"release notes for version {i}.0 with fixes" for i in range(50)]
+    update_index(index, path, [f"n{i}" for i in range(50)], texts)
+
+    assert not os.path.exists(get_journal_path(path))
+    drop_index(path)
+    assert len(load_index(path)) == 52
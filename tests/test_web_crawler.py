@@ -0,0 +1,89 @@
+import os
+import sys
+import asyncio
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.web_crawler import SiteCrawler
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler answers If-Modified-Since with 304.
+    def log_message(self, format, *args):
+        pass
+
+def write_page(root, name, links):
+    anchors = "".join(f'<a href="/{link}">{link}</a>' for link in links)
+    with open(os.path.join(root, name), "w", encoding="utf-8") as f:
+        f.write(f"<html><head><title>{name}</title></head><body><p>Text of {name}</p>{anchors}</body></html>")
+
+@pytest.fixture
+def site(tmp_path):
+    # index -> page1 -> page2 -> page3 is one chain; orphan.html is only in the sitemap.
+    root = str(tmp_path)
+    write_page(root, "index.html", ["page1.html"])
+    write_page(root, "page1.html", ["page2.html"])
+    write_page(root, "page2.html", ["page3.html"])
+    write_page(root, "page3.html", [])
+    write_page(root, "orphan.html", [])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=root))
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    with open(os.path.join(root, "sitemap.xml"), "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f"<url><loc>{base}/orphan.html</loc></url></urlset>")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield base, root
+    server.shutdown()
+    server.server_close()
+
+def crawl(base, **kwargs):
+    pages = []
+    crawler = SiteCrawler(f"{base}/", concurrency=4, **kwargs)
+    asyncio.run(crawler.crawl(pages.append))
+    return crawler, {page["url"]: page for page in pages}
+
+def test_crawl_stops_at_max_depth(site):
+    base, _ = site
+    _, pages = crawl(base, max_depth=2, use_sitemap=False)
+    assert set(pages) == {f"{base}/", f"{base}/page1.html", f"{base}/page2.html"}
+
+def test_crawl_stops_at_max_pages(site):
+    base, _ = site
+    crawler, pages = crawl(base, max_pages=2, max_depth=5, use_sitemap=False)
+    assert len(pages) == 2
+    assert crawler.stats["pages_fetched"] == 2
+
+def test_sitemap_finds_unlinked_pages(site):
+    base, _ = site
+    _, pages = crawl(base, max_depth=1)
+    assert set(pages) == {f"{base}/", f"{base}/page1.html", f"{base}/orphan.html"}
+
+def test_recrawl_skips_unchanged_pages(site):
+    base, _ = site
+    _, first = crawl(base, max_depth=5)
+    validators = {
+        url: {key: page[key] for key in ("etag", "last_modified", "content_hash", "links")}
+        for url, page in first.items()
+    }
+
+    crawler, pages = crawl(base, max_depth=5, validators=validators)
+    assert pages == {}
+    assert crawler.stats["pages_unchanged"] == len(first)
+    assert crawler.stats["pages_fetched"] == 0
+    # Links of unchanged pages come from the validators, so the whole site is still reached.
+    assert crawler.reached == set(first)
+    assert crawler.complete
+
+def test_missing_pages_are_not_reached(site):
+    base, root = site
+    os.remove(os.path.join(root, "page2.html"))
+    crawler, pages = crawl(base, max_depth=5, use_sitemap=False)
+    assert set(pages) == {f"{base}/", f"{base}/page1.html"}
+    assert crawler.stats["pages_failed"] == 1
+    # A 404 is not a transient failure, so the crawl still counts as complete.
+    assert crawler.complete
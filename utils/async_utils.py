@@ -0,0 +1,43 @@
+import os
+import asyncio
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+RAG_EXECUTOR_WORKERS = int(os.environ.get("RAG_EXECUTOR_WORKERS", "4"))
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", "8"))
+
+# Embedding and vector search are CPU bound, so they get their own small pool;
+# SQLite calls are short and get a separate one so they never queue behind them.
+# Pools are created on first use, so a server started again after
+# shutdown_executors (tests, embedded servers) gets fresh ones.
+_executors = {}
+_executors_lock = threading.Lock()
+EXECUTOR_WORKERS = {"rag": RAG_EXECUTOR_WORKERS, "db": DB_EXECUTOR_WORKERS}
+
+def get_executor(name):
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = _executors[name] = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS[name], thread_name_prefix=name)
+        return executor
+
+# run_in_executor does not carry context variables over, so the call runs in a copy of
+# the caller's context; request-scoped state such as stage timings stays visible.
+async def run_in_rag_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor("rag"), partial(context.run, func, *args, **kwargs))
+
+async def run_in_db_executor(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor("db"), partial(context.run, func, *args, **kwargs))
+
+def shutdown_executors():
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
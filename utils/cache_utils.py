@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, max_entries=128, max_bytes=None, ttl_seconds=None, sizeof=None, on_evict=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof or (lambda value: 0)
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                self._total_bytes -= entry[1]
+                self.expirations += 1
+                self.misses += 1
+                expired = entry
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        self._notify([(key, expired[0])])
+        return None
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._entries[key] = (value, size, expires_at)
+            self._total_bytes += size
+            while len(self._entries) > 1 and self._over_budget():
+                old_key, (old_value, old_size, _) = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+        self._notify(evicted)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._total_bytes -= entry[1]
+        self._notify([(key, entry[0])])
+        return entry[0]
+
+    def clear(self):
+        with self._lock:
+            evicted = [(key, entry[0]) for key, entry in self._entries.items()]
+            self._entries.clear()
+            self._total_bytes = 0
+        self._notify(evicted)
+
+    def _over_budget(self):
+        if self.max_entries is not None and len(self._entries) > self.max_entries:
+            return True
+        if self.max_bytes is not None and self._total_bytes > self.max_bytes:
+            return True
+        return False
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "approx_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
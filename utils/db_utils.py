@@ -1,16 +1,33 @@
+import os
+import queue
+import base64
 import sqlite3
+import threading
 import uuid
 import bcrypt
+from contextlib import contextmanager
 from datetime import datetime
 import json
 from fastapi import HTTPException
 
-DB_PATH = 'users.db'
+DB_PATH = os.environ.get("DB_PATH", "users.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = 5000
 
-def init_db():
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute('''
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+]
+
+# Each entry moves the schema one version forward; PRAGMA user_version records
+# how many have been applied.
+MIGRATIONS = [
+    [
+        '''
         CREATE TABLE IF NOT EXISTS users (
             user_id TEXT PRIMARY KEY,
             username TEXT UNIQUE,
@@ -18,40 +35,213 @@ def init_db():
             email TEXT UNIQUE,
             password TEXT
         )
-    ''')
-    c.execute('''
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS sessions (
             session_id TEXT PRIMARY KEY,
             user_id TEXT,
             creation_time TEXT,
             conversation TEXT
         )
-    ''')
-    conn.commit()
-    conn.close()
+        ''',
+    ],
+    [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_sessions_user_creation
+        ON sessions(user_id, creation_time DESC, session_id)
+        ''',
+    ],
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            session_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TEXT,
+            PRIMARY KEY (session_id, seq)
+        ) WITHOUT ROWID
+        ''',
+        lambda conn: _migrate_conversation_blobs(conn),
+    ],
+    [
+        lambda conn: _add_column(conn, "sessions", "answer_cache", "INTEGER NOT NULL DEFAULT 1"),
+    ],
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS sources (
+            fingerprint TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            origin TEXT,
+            chunk_count INTEGER,
+            created_at TEXT,
+            refreshed_at TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS session_sources (
+            session_id TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            linked_at TEXT,
+            PRIMARY KEY (session_id, fingerprint)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_session_sources_fingerprint
+        ON session_sources(fingerprint)
+        ''',
+    ],
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS store_activity (
+            user_id TEXT NOT NULL,
+            store_name TEXT NOT NULL,
+            last_accessed REAL NOT NULL,
+            PRIMARY KEY (user_id, store_name)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_store_activity_last_accessed
+        ON store_activity(last_accessed)
+        ''',
+    ],
+]
+
+class ConnectionPool:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _migrate_conversation_blobs(conn):
+    rows = conn.execute("SELECT session_id, creation_time, conversation FROM sessions WHERE conversation IS NOT NULL").fetchall()
+    for session_id, creation_time, conversation_json in rows:
+        try:
+            conversation = json.loads(conversation_json)
+        except json.JSONDecodeError:
+            conversation = []
+        conn.executemany(
+            "INSERT OR IGNORE INTO messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(session_id, seq, message["role"], message["content"], creation_time) for seq, message in enumerate(conversation)]
+        )
+    conn.execute("UPDATE sessions SET conversation = NULL")
+
+def _add_column(conn, table, column, definition):
+    # ALTER TABLE has no IF NOT EXISTS.
+    if column not in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migrate(conn):
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= len(MIGRATIONS):
+        return
+    # The Streamlit app and the API both call init_db(); take the write lock before
+    # reading the version again so only one process applies each migration.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def init_db():
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+            conn = pool.acquire()
+            try:
+                _migrate(conn)
+            finally:
+                pool.release(conn)
+            _pool = pool
+    return _pool
+
+@contextmanager
+def get_connection():
+    pool = init_db()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def write_transaction():
+    # BEGIN IMMEDIATE takes the write lock up front, so a check and the writes that
+    # depend on it cannot interleave with another process using the same database.
+    with get_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
 
 def add_user(username, name, email, password):
     hashed_pw = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
     user_id = str(uuid.uuid4())
 
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO users (username, name, email, password, user_id) VALUES (?, ?, ?, ?, ?)",
-                  (username, name, email, hashed_pw, user_id))
-        conn.commit()
-        conn.close()
-        return True, user_id
-    except sqlite3.IntegrityError:
-        conn.close()
-        return False, "Username or email already exists"
+    with get_connection() as conn:
+        try:
+            with conn:
+                conn.execute("INSERT INTO users (username, name, email, password, user_id) VALUES (?, ?, ?, ?, ?)",
+                             (username, name, email, hashed_pw, user_id))
+            return True, user_id
+        except sqlite3.IntegrityError:
+            return False, "Username or email already exists"
 
 def verify_user(username, password):
-    conn = sqlite3.connect('users.db')
-    c = conn.cursor()
-    c.execute("SELECT name, email, password, user_id FROM users WHERE username=?", (username,))
-    row = c.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        row = conn.execute("SELECT name, email, password, user_id FROM users WHERE username=?", (username,)).fetchone()
 
     if row:
         name, email, hashed_pw, user_id = row
@@ -62,129 +252,274 @@ def verify_user(username, password):
 def create_session_record(user_id):
     session_id = str(uuid.uuid4())
     creation_time = datetime.now().isoformat()
-    conversation = [{"role": "assistant", "content": "How can I help you?"}]
-    conversation_json = json.dumps(conversation)
-
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO sessions (session_id, user_id, creation_time, conversation)
-        VALUES (?, ?, ?, ?)
-    ''', (session_id, user_id, creation_time, conversation_json))
-    conn.commit()
-    conn.close()
+
+    with get_connection() as conn:
+        with conn:
+            conn.execute('''
+                INSERT INTO sessions (session_id, user_id, creation_time)
+                VALUES (?, ?, ?)
+            ''', (session_id, user_id, creation_time))
+            conn.execute('''
+                INSERT INTO messages (session_id, seq, role, content, created_at)
+                VALUES (?, 0, 'assistant', 'How can I help you?', ?)
+            ''', (session_id, creation_time))
     return session_id
 
+def _next_seq(conn, session_id):
+    return conn.execute('''
+        SELECT COALESCE(MAX(seq), -1) + 1 FROM messages WHERE session_id = ?
+    ''', (session_id,)).fetchone()[0]
+
+def _append_messages(conn, session_id, messages, skip_stored=False):
+    # BEGIN IMMEDIATE takes the write lock up front so concurrent appends to the
+    # same session cannot read the same next sequence number.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        next_seq = _next_seq(conn, session_id)
+        if skip_stored:
+            messages = messages[next_seq:]
+        created_at = datetime.now().isoformat()
+        conn.executemany('''
+            INSERT INTO messages (session_id, seq, role, content, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(session_id, next_seq + i, message["role"], message["content"], created_at)
+              for i, message in enumerate(messages)])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def append_messages(session_id, messages):
+    with get_connection() as conn:
+        _append_messages(conn, session_id, messages)
+
 def update_conversation_in_db(session_id, messages):
-    conversation_json = json.dumps(messages)
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''
-        UPDATE sessions SET conversation = ? WHERE session_id = ?
-    ''', (conversation_json, session_id))
-    conn.commit()
-    conn.close()
-    
-def get_all_messages_helper(user_id, session_id):
+    # Conversations are append-only, so only messages past the stored count are written.
+    with get_connection() as conn:
+        _append_messages(conn, session_id, messages, skip_stored=True)
+
+def _session_exists(conn, user_id, session_id):
+    row = conn.execute('''
+        SELECT 1 FROM sessions WHERE user_id = ? AND session_id = ?
+    ''', (user_id, session_id)).fetchone()
+    return row is not None
+
+def _fetch_messages(conn, session_id, last_n=None):
+    if last_n is None:
+        rows = conn.execute('''
+            SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq
+        ''', (session_id,)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?
+        ''', (session_id, last_n)).fetchall()
+        rows.reverse()
+    return [{"role": role, "content": content} for role, content in rows]
+
+def ensure_session_helper(user_id, session_id):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            SELECT conversation FROM sessions
-            WHERE user_id = ? AND session_id = ?
-        ''', (user_id, session_id))
-        row = c.fetchone()
+        with get_connection() as conn:
+            exists = _session_exists(conn, user_id, session_id)
+    except sqlite3.Error as db_error:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+    if not exists:
+        raise HTTPException(status_code=404, detail="Session not found for given user_id and session_id")
+
+def get_session_settings_helper(user_id, session_id):
+    try:
+        with get_connection() as conn:
+            row = conn.execute('''
+                SELECT answer_cache FROM sessions WHERE user_id = ? AND session_id = ?
+            ''', (user_id, session_id)).fetchone()
     except sqlite3.Error as db_error:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
-    finally:
-        conn.close()
 
     if not row:
         raise HTTPException(status_code=404, detail="Session not found for given user_id and session_id")
 
-    conversation_json = row[0]
+    return {"answer_cache": bool(row[0])}
+
+def update_session_settings_helper(user_id, session_id, answer_cache):
+    try:
+        with get_connection() as conn:
+            with conn:
+                cursor = conn.execute('''
+                    UPDATE sessions SET answer_cache = ? WHERE user_id = ? AND session_id = ?
+                ''', (int(answer_cache), user_id, session_id))
+    except sqlite3.Error as db_error:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Session not found for given user_id and session_id")
+
+    return {"answer_cache": bool(answer_cache)}
+
+def append_messages_helper(user_id, session_id, messages):
     try:
-        conversation = json.loads(conversation_json)
-    except json.JSONDecodeError:
-        conversation = []
+        with get_connection() as conn:
+            exists = _session_exists(conn, user_id, session_id)
+            if exists:
+                _append_messages(conn, session_id, messages)
+    except sqlite3.Error as db_error:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+    if not exists:
+        raise HTTPException(status_code=404, detail="Session not found for given user_id and session_id")
+
+def get_all_messages_helper(user_id, session_id, last_n=None):
+    try:
+        with get_connection() as conn:
+            exists = _session_exists(conn, user_id, session_id)
+            conversation = _fetch_messages(conn, session_id, last_n) if exists else []
+    except sqlite3.Error as db_error:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+    if not exists:
+        raise HTTPException(status_code=404, detail="Session not found for given user_id and session_id")
 
     return conversation
 
 def get_session_details_helper(user_id, session_id):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            SELECT session_id, creation_time, conversation
-            FROM sessions
-            WHERE user_id = ? AND session_id = ?
-        ''', (user_id, session_id))
-        row = c.fetchone()
+        with get_connection() as conn:
+            row = conn.execute('''
+                SELECT session_id, creation_time
+                FROM sessions
+                WHERE user_id = ? AND session_id = ?
+            ''', (user_id, session_id)).fetchone()
+            conversation = _fetch_messages(conn, session_id) if row else []
     except sqlite3.Error as db_error:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
-    finally:
-        conn.close()
 
     if not row:
         raise HTTPException(status_code=404, detail="Session not found for given user_id and session_id")
 
-    session_id, creation_time, conversation_json = row
-
-    try:
-        conversation = json.loads(conversation_json)
-    except json.JSONDecodeError:
-        conversation = []
+    session_id, creation_time = row
 
     return {
         "session_id": session_id,
         "creation_time": creation_time,
         "conversation": conversation
     }
-    
+
 def get_all_sessions_helper(user_id: str):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            SELECT session_id, creation_time, conversation FROM sessions
-            WHERE user_id = ?
-            ORDER BY creation_time DESC
-        ''', (user_id,))
-        rows = c.fetchall()
+        with get_connection() as conn:
+            rows = conn.execute('''
+                SELECT s.session_id, s.creation_time, m.role, m.content
+                FROM sessions s
+                LEFT JOIN messages m ON m.session_id = s.session_id
+                WHERE s.user_id = ?
+                ORDER BY s.creation_time DESC, s.session_id, m.seq
+            ''', (user_id,)).fetchall()
     except sqlite3.Error as db_error:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
-    finally:
-        conn.close()
 
     if not rows:
         raise HTTPException(status_code=404, detail="No sessions found for given user_id")
 
     sessions = []
-    for session_id, creation_time, conversation_json in rows:
-        try:
-            conversation = json.loads(conversation_json)
-        except json.JSONDecodeError:
-            conversation = []
+    for session_id, creation_time, role, content in rows:
+        if not sessions or sessions[-1]["session_id"] != session_id:
+            sessions.append({
+                "session_id": session_id,
+                "creation_time": creation_time,
+                "conversation": []
+            })
+        if role is not None:
+            sessions[-1]["conversation"].append({"role": role, "content": content})
+
+    return sessions
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return values
+
+def get_session_summaries_helper(user_id: str, limit=20, cursor=None):
+    # message_count and last_activity come from the newest message row, which the
+    # (session_id, seq) primary key finds without reading the conversation.
+    query = '''
+        SELECT s.session_id, s.creation_time, m.seq + 1, m.created_at
+        FROM sessions s
+        LEFT JOIN messages m ON m.session_id = s.session_id
+            AND m.seq = (SELECT MAX(seq) FROM messages WHERE session_id = s.session_id)
+        WHERE s.user_id = ?
+    '''
+    params = [user_id]
+    if cursor:
+        creation_time, session_id = decode_cursor(cursor, 2)
+        query += " AND (s.creation_time < ? OR (s.creation_time = ? AND s.session_id > ?))"
+        params += [creation_time, creation_time, session_id]
+    query += " ORDER BY s.creation_time DESC, s.session_id LIMIT ?"
+    params.append(limit + 1)
+
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+    except sqlite3.Error as db_error:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+    sessions = []
+    for session_id, creation_time, message_count, last_activity in rows[:limit]:
         sessions.append({
             "session_id": session_id,
             "creation_time": creation_time,
-            "conversation": conversation
+            "message_count": message_count or 0,
+            "last_activity": last_activity or creation_time
         })
 
-    return sessions
+    next_cursor = None
+    if len(rows) > limit:
+        last = sessions[-1]
+        next_cursor = encode_cursor([last["creation_time"], last["session_id"]])
+
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+def get_users_page_helper(limit=50, cursor=None):
+    query = "SELECT username, name, email, user_id FROM users"
+    params = []
+    if cursor:
+        (last_user_id,) = decode_cursor(cursor, 1)
+        query += " WHERE user_id > ?"
+        params.append(last_user_id)
+    query += " ORDER BY user_id LIMIT ?"
+    params.append(limit + 1)
+
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+    except sqlite3.Error as db_error:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+    users = []
+    for username, name, email, user_id in rows[:limit]:
+        users.append({
+            "username": username,
+            "name": name,
+            "email": email,
+            "user_id": user_id
+        })
+
+    next_cursor = encode_cursor([users[-1]["user_id"]]) if len(rows) > limit else None
+    return {"users": users, "next_cursor": next_cursor}
 
 def get_all_users_helper():
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            SELECT username, name, email, user_id FROM users
-        ''')
-        rows = c.fetchall()
+        with get_connection() as conn:
+            rows = conn.execute('''
+                SELECT username, name, email, user_id FROM users
+            ''').fetchall()
     except sqlite3.Error as db_error:
         raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
-    finally:
-        conn.close()
 
     if not rows:
         raise HTTPException(status_code=404, detail="No users found")
@@ -202,16 +537,125 @@ def get_all_users_helper():
 
 def delete_session_helper(user_id: str, session_id: str):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            DELETE FROM sessions WHERE user_id = ? AND session_id = ?
-        ''', (user_id, session_id))
-        deleted_count = c.rowcount
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            with conn:
+                cursor = conn.execute('''
+                    DELETE FROM sessions WHERE user_id = ? AND session_id = ?
+                ''', (user_id, session_id))
+                deleted_count = cursor.rowcount
+                if deleted_count:
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
         if deleted_count == 0:
             return {"success": False, "message": "No such session found"}
         return {"success": True, "message": "Session deleted successfully"}
     except sqlite3.Error as db_error:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Database error: {str(db_error)}")
+
+def _record_source(conn, fingerprint, kind, origin, chunk_count):
+    now = datetime.now().isoformat()
+    conn.execute('''
+        INSERT INTO sources (fingerprint, kind, origin, chunk_count, created_at, refreshed_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(fingerprint) DO UPDATE SET chunk_count = excluded.chunk_count, refreshed_at = excluded.refreshed_at
+    ''', (fingerprint, kind, origin, chunk_count, now, now))
+
+def get_source_record(fingerprint):
+    with get_connection() as conn:
+        row = conn.execute('''
+            SELECT fingerprint, kind, origin, chunk_count, created_at, refreshed_at FROM sources WHERE fingerprint = ?
+        ''', (fingerprint,)).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("fingerprint", "kind", "origin", "chunk_count", "created_at", "refreshed_at"), row))
+
+def _link_session_source(conn, user_id, session_id, fingerprint, name):
+    conn.execute('''
+        INSERT INTO session_sources (session_id, fingerprint, user_id, name, linked_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(session_id, fingerprint) DO UPDATE SET name = excluded.name
+    ''', (session_id, fingerprint, user_id, name, datetime.now().isoformat()))
+
+def link_recorded_source(user_id, session_id, fingerprint, name, is_usable):
+    # Links the session only if the source is recorded and is_usable(record) holds, and
+    # returns the record. Runs under the write lock, so unlink_session_source cannot
+    # drop the source in between.
+    with write_transaction() as conn:
+        row = conn.execute('''
+            SELECT fingerprint, kind, origin, chunk_count, created_at, refreshed_at FROM sources WHERE fingerprint = ?
+        ''', (fingerprint,)).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(("fingerprint", "kind", "origin", "chunk_count", "created_at", "refreshed_at"), row))
+        if not is_usable(record):
+            return None
+        _link_session_source(conn, user_id, session_id, fingerprint, name)
+        return record
+
+def record_linked_source(user_id, session_id, fingerprint, name, kind, origin, chunk_count):
+    with write_transaction() as conn:
+        _record_source(conn, fingerprint, kind, origin, chunk_count)
+        _link_session_source(conn, user_id, session_id, fingerprint, name)
+
+def get_session_sources(user_id, session_id):
+    with get_connection() as conn:
+        rows = conn.execute('''
+            SELECT l.fingerprint, l.name, s.kind, s.chunk_count
+            FROM session_sources l
+            JOIN sources s ON s.fingerprint = l.fingerprint
+            WHERE l.session_id = ? AND l.user_id = ?
+            ORDER BY l.linked_at
+        ''', (session_id, user_id)).fetchall()
+    return [{"fingerprint": fingerprint, "name": name, "kind": kind, "chunk_count": chunk_count}
+            for fingerprint, name, kind, chunk_count in rows]
+
+def unlink_session_source(user_id, session_id, fingerprint, on_release=None):
+    # Returns True when no session references the source any more and its record was
+    # dropped. on_release runs before the commit, under the write lock, so the source's
+    # data is gone before another process can see the source as missing and rebuild it.
+    with write_transaction() as conn:
+        conn.execute('''
+            DELETE FROM session_sources WHERE session_id = ? AND user_id = ? AND fingerprint = ?
+        ''', (session_id, user_id, fingerprint))
+        referenced = conn.execute(
+            "SELECT 1 FROM session_sources WHERE fingerprint = ? LIMIT 1", (fingerprint,)
+        ).fetchone()
+        if referenced:
+            return False
+        conn.execute("DELETE FROM sources WHERE fingerprint = ?", (fingerprint,))
+        if on_release:
+            on_release()
+        return True
+
+def record_store_activity(accesses, keep_existing=False):
+    # accesses are (user_id, store_name, last_accessed); keep_existing only fills in
+    # stores that have no activity recorded yet.
+    conflict = "DO NOTHING" if keep_existing else "DO UPDATE SET last_accessed = MAX(last_accessed, excluded.last_accessed)"
+    with get_connection() as conn:
+        with conn:
+            conn.executemany(f'''
+                INSERT INTO store_activity (user_id, store_name, last_accessed) VALUES (?, ?, ?)
+                ON CONFLICT(user_id, store_name) {conflict}
+            ''', accesses)
+
+def record_untracked_session_stores(accessed_at, source_owner):
+    # For the shared layout, where stores have no directories to list: every session's
+    # store and every shared source's store that has no activity yet counts as used now.
+    with get_connection() as conn:
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO store_activity (user_id, store_name, last_accessed)
+                SELECT user_id, session_id, ? FROM sessions
+                UNION ALL
+                SELECT ?, fingerprint, ? FROM sources
+            ''', (accessed_at, source_owner, accessed_at))
+
+def get_inactive_stores(before):
+    with get_connection() as conn:
+        return conn.execute('''
+            SELECT user_id, store_name FROM store_activity WHERE last_accessed < ? ORDER BY last_accessed
+        ''', (before,)).fetchall()
+
+def forget_store_activity(user_id, store_name):
+    with get_connection() as conn:
+        with conn:
+            conn.execute("DELETE FROM store_activity WHERE user_id = ? AND store_name = ?", (user_id, store_name))
@@ -0,0 +1,121 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+INGESTION_WORKERS = int(os.environ.get("INGESTION_WORKERS", "2"))
+MAX_FINISHED_JOBS = 1000
+
+# Ingestion gets its own pool so chat requests never queue behind it. It is created
+# on first use so the queue works again after shutdown_job_queue.
+_ingestion_executor = None
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def _get_ingestion_executor():
+    global _ingestion_executor
+    with _jobs_lock:
+        if _ingestion_executor is None:
+            _ingestion_executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix="ingest")
+        return _ingestion_executor
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+def _prune_finished_jobs():
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("completed", "failed")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+def _run_job(job_id, func, args):
+    started_at = time.time()
+    _update_job(job_id, status="running", started_at=started_at)
+
+    def progress(stage, **fields):
+        if stage == "failed":
+            _update_job(job_id, error=fields.get("error"))
+            return
+        _update_job(job_id, stage=stage, **fields)
+
+    try:
+        result = func(*args, progress=progress)
+    except Exception as e:
+        print(f"Error running ingestion job {job_id}: {str(e)}")
+        _update_job(job_id, status="failed", stage="done", error=str(e), finished_at=time.time())
+        return
+
+    finished_at = time.time()
+    with _jobs_lock:
+        job = _jobs[job_id]
+        elapsed = finished_at - started_at
+        job.update({
+            "stage": "done",
+            "finished_at": finished_at,
+            "elapsed_seconds": round(elapsed, 2),
+        })
+        if result is None:
+            job["status"] = "failed"
+            job["error"] = job.get("error") or "No content could be ingested from the source"
+        else:
+            job["status"] = "completed"
+            if job.get("chunks_total") and elapsed:
+                job["chunks_per_second"] = round(job["chunks_total"] / elapsed, 2)
+
+def submit_job(kind, user_id, session_id, func, *args):
+    job_id = str(uuid.uuid4())
+    with _jobs_lock:
+        _prune_finished_jobs()
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "kind": kind,
+            "user_id": user_id,
+            "session_id": session_id,
+            "status": "queued",
+            "stage": "queued",
+            "files_total": None,
+            "files_parsed": None,
+            "documents": None,
+            "chunks_total": None,
+            "chunks_embedded": None,
+            "chunks_new": None,
+            "chunks_unchanged": None,
+            "chunks_removed": None,
+            "pages_fetched": None,
+            "pages_unchanged": None,
+            "pages_per_second": None,
+            "sources_linked": None,
+            "embed_chunks_per_second": None,
+            "embedding_cache_hits": None,
+            "embedding_cache_hit_rate": None,
+            "embedding_time_saved_ms": None,
+            "chunks_per_second": None,
+            "elapsed_seconds": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+    _get_ingestion_executor().submit(_run_job, job_id, func, args)
+    return job_id
+
+def get_job(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+def get_session_jobs(user_id, session_id):
+    with _jobs_lock:
+        return [dict(job) for job in _jobs.values()
+                if job["user_id"] == user_id and job["session_id"] == session_id]
+
+def shutdown_job_queue():
+    global _ingestion_executor
+    with _jobs_lock:
+        executor, _ingestion_executor = _ingestion_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,148 @@
+import time
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def _labels(self, key, extra=None):
+        pairs = list(zip(self.label_names, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(data["counts"]), data["sum"], data["count"]) for key, data in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._labels(key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._labels(key)} {count}")
+        return "\n".join(lines)
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def value(self):
+        return self._value
+
+    def render(self):
+        return "\n".join([f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self._value}"])
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            labels = ",".join(f'{name}="{label}"' for name, label in zip(self.label_names, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return "\n".join(lines)
+
+stage_seconds = Histogram(
+    "rag_stage_duration_seconds", "Time spent in each stage of answering a question", label_names=("stage",)
+)
+request_seconds = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", label_names=("method", "route", "status")
+)
+prompt_tokens = Histogram("llm_prompt_tokens", "Estimated tokens in each prompt sent to the LLM", buckets=TOKEN_BUCKETS)
+prompt_chunks = Histogram("llm_prompt_context_chunks", "Context chunks in each prompt sent to the LLM", buckets=COUNT_BUCKETS)
+
+llm_upstream_seconds = Histogram(
+    "llm_upstream_duration_seconds", "Latency of each upstream LLM call attempt", label_names=("kind", "outcome")
+)
+llm_queue_wait_seconds = Histogram("llm_queue_wait_seconds", "Time LLM calls wait for a concurrency slot")
+llm_queue_depth = Gauge("llm_queue_depth", "LLM calls waiting for a concurrency slot")
+llm_in_flight = Gauge("llm_in_flight", "Upstream LLM calls in progress")
+llm_requests = Counter("llm_requests_total", "LLM generations by how they were served", label_names=("kind", "result"))
+llm_retries = Counter("llm_retries_total", "Upstream LLM call attempts that were retried", label_names=("reason",))
+
+METRICS = [
+    stage_seconds, request_seconds, prompt_tokens, prompt_chunks,
+    llm_upstream_seconds, llm_queue_wait_seconds, llm_queue_depth, llm_in_flight, llm_requests, llm_retries,
+]
+
+# Stage timings of the current request, read back for the Server-Timing header.
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def start_request_timing():
+    timings = []
+    _request_timings.set(timings)
+    return timings
+
+def record_stage(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+def format_server_timing(timings):
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings)
+
+def render_metrics():
+    return "\n\n".join(metric.render() for metric in METRICS) + "\n"